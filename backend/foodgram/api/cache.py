@@ -0,0 +1,161 @@
+import hashlib
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from foodgram.settings import (API_CACHE_ENABLED, API_CACHE_SHARED,
+                               API_CACHE_TIMEOUT, API_STAMP_TIMEOUT)
+from recipes.models import Ingredient, Recipe, Tag
+
+HITS_KEY = 'api:stats:hits'
+MISSES_KEY = 'api:stats:misses'
+
+# Таблицы, штамп которых при отсутствии в кэше берётся из БД.
+SCOPE_MODELS = {
+    'recipe': Recipe,
+    'tag': Tag,
+    'ingredient': Ingredient,
+}
+
+
+def stamp_key(scope):
+    return f'api:stamp:{scope}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def new_stamp():
+    return (time.time(), uuid.uuid4().hex)
+
+
+def load_stamp(scope):
+    """
+    Начальный штамп таблицы: время последнего изменения из updated_at
+    и число строк, чтобы удаление тоже меняло штамп.
+    """
+    model = SCOPE_MODELS.get(scope)
+    if model is None:
+        return new_stamp()
+    state = model.objects.order_by().aggregate(
+        last_modified=Max('updated_at'), total=Count('id')
+    )
+    last_modified = state['last_modified']
+    timestamp = last_modified.timestamp() if last_modified else 0
+    return (timestamp, f'db:{timestamp}:{state["total"]}')
+
+
+def get_stamps(scopes):
+    """ Возвращает штампы (время изменения, токен) для областей данных. """
+    keys = {stamp_key(scope): scope for scope in scopes}
+    stamps = cache.get_many(keys)
+    for key, scope in keys.items():
+        if key not in stamps:
+            cache.add(key, load_stamp(scope), timeout=API_STAMP_TIMEOUT)
+            stamps[key] = cache.get(key)
+    return {keys[key]: stamp for key, stamp in stamps.items()}
+
+
+def bump_version(scope):
+    """
+    Делает устаревшими ответы и ETag, зависящие от области данных.
+    Штамп меняется после коммита: иначе параллельный GET успеет
+    закэшировать данные до коммита уже под новым штампом.
+    """
+    transaction.on_commit(lambda: cache.set(
+        stamp_key(scope), new_stamp(), timeout=API_STAMP_TIMEOUT
+    ))
+
+
+def increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats():
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+        'stamps': get_stamps(SCOPE_MODELS),
+    }
+
+
+class CachedResponseMixin:
+    """
+    Условные GET и кэш ответов для list/retrieve.
+
+    ETag считается по URL, параметрам, пользователю и штампам областей
+    данных из cache_scopes, без сериализации: при совпадении
+    If-None-Match/If-Modified-Since сразу отдаётся 304. Ответы
+    анонимным пользователям дополнительно кэшируются по тому же ключу,
+    так что после bump_version() старые ответы перестают находиться.
+    Без общего для процессов кэша (API_CACHE_SHARED) ничего из этого
+    не делается.
+    """
+    cache_scopes = ()
+    cache_timeout = API_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cache_scopes(self, request):
+        scopes = list(self.cache_scopes)
+        if request.user.is_authenticated:
+            scopes.append(user_scope(request.user.id))
+        return scopes
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not API_CACHE_SHARED:
+            return handler(request, *args, **kwargs)
+        stamps = get_stamps(self.get_cache_scopes(request))
+        digest = hashlib.md5(repr((
+            request.build_absolute_uri(request.path),
+            sorted(request.query_params.lists()),
+            request.META.get('HTTP_ACCEPT'),
+            request.user.id,
+            sorted(stamps.items()),
+        )).encode()).hexdigest()
+        etag = f'"{digest}"'
+        last_modified = int(max(
+            (timestamp for timestamp, _ in stamps.values()), default=0
+        ))
+        not_modified = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        use_cache = API_CACHE_ENABLED and not request.user.is_authenticated
+        key = f'api:response:{digest}'
+        data = cache.get(key) if use_cache else None
+        if data is not None:
+            increment(HITS_KEY)
+            response = Response(data, headers={'X-Cache': 'HIT'})
+        else:
+            response = handler(request, *args, **kwargs)
+            if use_cache:
+                increment(MISSES_KEY)
+                if response.status_code == 200:
+                    cache.set(key, response.data, timeout=self.cache_timeout)
+                response['X-Cache'] = 'MISS'
+        if response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
@@ -0,0 +1,119 @@
+import csv
+from io import BytesIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from foodgram.settings import (SHOPPING_CART_PDF_FONT,
+                               SHOPPING_CART_RENDERERS)
+
+
+class Echo:
+    """ Псевдо-буфер для csv.writer: отдаёт строку вместо записи. """
+
+    def write(self, value):
+        return value
+
+
+class BaseShoppingCartRenderer:
+    """
+    Базовый класс выгрузки списка покупок.
+    render() получает итератор словарей с ключами name,
+    measurement_unit и total_amount и возвращает итератор частей файла.
+    """
+    content_type = None
+    extension = None
+
+    def render(self, items):
+        raise NotImplementedError
+
+
+class TextRenderer(BaseShoppingCartRenderer):
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, items):
+        for item in items:
+            yield (
+                f"{item['name']}: "
+                f"{item['total_amount']}{item['measurement_unit']}\n"
+            )
+
+
+class CSVRenderer(BaseShoppingCartRenderer):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, items):
+        writer = csv.writer(Echo())
+        # BOM, чтобы Excel правильно определил кодировку.
+        yield '\ufeff'
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for item in items:
+            yield writer.writerow((
+                item['name'],
+                item['total_amount'],
+                item['measurement_unit']
+            ))
+
+
+class PDFRenderer(BaseShoppingCartRenderer):
+    """
+    Выгрузка в PDF через reportlab.
+    Для кириллицы нужен TTF-шрифт: путь задаётся в SHOPPING_CART_PDF_FONT.
+    """
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    font_size = 12
+    line_height = 18
+    margin = 50
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        if not SHOPPING_CART_PDF_FONT:
+            return 'Helvetica'
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        pdfmetrics.registerFont(
+            TTFont('ShoppingCartFont', SHOPPING_CART_PDF_FONT)
+        )
+        return 'ShoppingCartFont'
+
+    def render(self, items):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        y = height - self.margin
+        pdf.setFont(font, self.font_size)
+        for item in items:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin, y,
+                f"{item['name']}: "
+                f"{item['total_amount']}{item['measurement_unit']}"
+            )
+            y -= self.line_height
+        pdf.save()
+        data = buffer.getbuffer()
+        for start in range(0, len(data), self.chunk_size):
+            yield bytes(data[start:start + self.chunk_size])
+
+
+def get_renderer(file_format):
+    """ Возвращает выгрузку для формата или None, если формат не задан. """
+    path = SHOPPING_CART_RENDERERS.get(file_format)
+    if path is None:
+        return None
+    try:
+        return import_string(path)()
+    except ImportError as error:
+        raise ImproperlyConfigured(
+            f'Не удалось загрузить выгрузку {path}: {error}'
+        )
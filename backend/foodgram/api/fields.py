@@ -0,0 +1,122 @@
+import base64
+import binascii
+import re
+import uuid
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from drf_base64.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from foodgram.settings import (IMAGE_URL_CACHE_SIZE, RECIPE_IMAGE_FORMATS,
+                               RECIPE_IMAGE_MAX_DIMENSION,
+                               RECIPE_IMAGE_MAX_SIZE)
+
+# Кратно 4, чтобы каждый кусок base64 декодировался отдельно.
+DECODE_CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {'JPEG': 'jpg'}
+WHITESPACE = re.compile(r'\s')
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Картинка рецепта в base64 или файлом с проверками до полной
+    обработки. Размер проверяется по длине строки ещё до декодирования
+    (у загруженного файла - по его размеру),
+    base64 декодируется кусками во временный файл (в памяти до 1 МБ,
+    дальше на диске), а формат и размеры в пикселях читаются из
+    заголовка картинки без распаковки.
+    """
+
+    def _decode(self, data):
+        if isinstance(data, UploadedFile):
+            # Файл из multipart-запроса: те же проверки до Pillow.
+            self._check_size(data.size)
+            data.seek(0)
+            self._read_header(data)
+            data.seek(0)
+            return data
+        if not isinstance(data, str) or not data.startswith('data:'):
+            return super()._decode(data)
+        _, _, payload = data.partition(';base64,')
+        self._check_size(len(payload) * 3 // 4)
+        if WHITESPACE.search(payload):
+            payload = ''.join(payload.split())
+        file = SpooledTemporaryFile(max_size=1024 * 1024)
+        try:
+            # validate=True: посторонние символы в любом куске - ошибка,
+            # а не молча отброшенные байты.
+            for start in range(0, len(payload), DECODE_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    payload[start:start + DECODE_CHUNK_SIZE], validate=True))
+        except binascii.Error:
+            raise serializers.ValidationError(
+                'Картинка должна быть в base64.')
+        file.seek(0)
+        image_format = self._read_header(file)
+        file.seek(0)
+        extension = EXTENSIONS.get(image_format, image_format.lower())
+        return File(file, name=f'{uuid.uuid4()}.{extension}')
+
+    @staticmethod
+    def _check_size(size):
+        if size > RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Размер картинки больше '
+                f'{RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ.'
+            )
+
+    @staticmethod
+    def _read_header(file):
+        """ Формат и размеры из заголовка; возвращает формат. """
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError(
+                'Загрузите корректное изображение.')
+        if image_format not in RECIPE_IMAGE_FORMATS:
+            raise serializers.ValidationError(
+                f'Поддерживаемые форматы: {", ".join(RECIPE_IMAGE_FORMATS)}.')
+        if max(width, height) > RECIPE_IMAGE_MAX_DIMENSION:
+            raise serializers.ValidationError(
+                f'Стороны картинки должны быть не больше '
+                f'{RECIPE_IMAGE_MAX_DIMENSION} пикселей.'
+            )
+        return image_format
+
+
+@lru_cache(maxsize=IMAGE_URL_CACHE_SIZE)
+def storage_url(name):
+    """ URL файла в хранилище; имена файлов не меняются, их URL тоже. """
+    return default_storage.url(name)
+
+
+class ImageURLField(serializers.Field):
+    """
+    Картинка только для чтения: URL из имени файла, без обращения
+    к самому файлу и без повторного разбора ALLOWED_HOSTS для каждой
+    записи - адрес сайта считается один раз на запрос.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = storage_url(value.name)
+        request = self.context.get('request')
+        if request is None or not url.startswith('/'):
+            return url
+        root = getattr(request, '_absolute_root', None)
+        if root is None:
+            root = request.build_absolute_uri('/')[:-1]
+            request._absolute_root = root
+        return root + url
@@ -1,7 +1,17 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe, Tag, TagRecipe
+
+# Сортировки списка рецептов; последним полем всегда идёт pk,
+# чтобы по ним работала пагинация по ключу.
+RECIPE_ORDERINGS = {
+    'newest': ('-pk',),
+    'popular': ('-favorites_count', '-pk'),
+    'fastest': ('cooking_time', '-pk'),
+    'trending': ('trending_rank', '-pk'),
+}
 
 
 class CustomFilter(filters.FilterSet):
@@ -10,23 +20,51 @@ class CustomFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart')
     author = filters.CharFilter(field_name='author__id'
                                 )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(key, key) for key in RECIPE_ORDERINGS],
+        method='filter_ordering'
+    )
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags'
     )
 
+    def filter_tags(self, queryset, name, value):
+        """
+        EXISTS по TagRecipe вместо JOIN: рецепт с несколькими
+        выбранными тегами не дублируется, и DISTINCT не нужен.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'trending':
+            queryset = queryset.filter(trending__isnull=False).annotate(
+                trending_rank=F('trending__rank'))
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
+        return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shoppinglist__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags',)
+        fields = ('author', 'tags', 'search', 'ordering',)
         
 class CustomSearchFilter(SearchFilter):
     search_param = 'name'
@@ -0,0 +1,156 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.settings import RECIPE_PAGINATION_COUNT
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по плану запроса PostgreSQL вместо COUNT(*).
+    На других СУБД считает точно.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу (курсору) без OFFSET и COUNT(*).
+
+    Курсор - значения полей сортировки последней записи страницы;
+    следующая страница выбирается условием
+    (a < x) OR (a = x AND b < y) ..., которое работает и для составных
+    ключей. Сортировка берётся у view.get_ordering(), если он есть,
+    и всегда заканчивается уникальным pk.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pk',)
+    count_mode = RECIPE_PAGINATION_COUNT
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, view):
+        get_ordering = getattr(view, 'get_ordering', None)
+        ordering = tuple(get_ordering()) if get_ordering else self.ordering
+        if not {'pk', '-pk', 'id', '-id'} & set(ordering):
+            ordering += ('-pk',)
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound('Неверный курсор.')
+        if not isinstance(position, list) or len(position) != len(
+                self.ordering_fields):
+            raise NotFound('Неверный курсор.')
+        return position
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def keyset_filter(self, position):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering_fields, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_count(self, queryset):
+        if self.count_mode == 'none':
+            return None
+        if self.count_mode == 'estimate':
+            return estimate_count(queryset)
+        return queryset.count()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering_fields = self.get_ordering(view)
+        self.count = self.get_count(queryset)
+        queryset = queryset.order_by(*self.ordering_fields)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            last = results[-1]
+            self.next_position = [
+                getattr(last, field.lstrip('-'))
+                for field in self.ordering_fields
+            ]
+        return results
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        )))
+
+
+class RecipePagination(BasePagination):
+    """
+    Постраничная пагинация по умолчанию; с параметром
+    pagination=cursor или cursor=... - пагинация по ключу.
+    """
+    mode_query_param = 'pagination'
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.paginator = KeysetPagination()
+        else:
+            self.paginator = PageNumberPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
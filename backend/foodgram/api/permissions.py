@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from foodgram.settings import PROFILING_METRICS_IPS
+
 
 class IsAuthorOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -11,3 +13,12 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in permissions.SAFE_METHODS
                 or obj.author.id == request.user.id)
+
+
+class IsInternalOrAdmin(permissions.BasePermission):
+    """ Запросы с внутренних адресов (сборщик метрик) или от админа. """
+    def has_permission(self, request, view):
+        return (
+            request.META.get('REMOTE_ADDR') in PROFILING_METRICS_IPS
+            or request.user.is_staff
+        )
@@ -0,0 +1,353 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+from api.cache import HITS_KEY, MISSES_KEY
+from foodgram.settings import (API_CACHE_SHARED, PROFILING_ENABLED,
+                               PROFILING_FLUSH_INTERVAL,
+                               PROFILING_SERVER_TIMING,
+                               PROFILING_SLOW_SAMPLE_RATE, PROFILING_SLOW_MS)
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограммы времени ответа, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Суммы, которые копятся по каждому представлению. Время хранится
+# в микросекундах: cache.incr работает только с целыми.
+FIELDS = (
+    'requests', 'wall_us', 'db_us', 'queries', 'duplicates', 'serializer_us',
+)
+
+VIEWS_KEY = 'profiling:views'
+
+local = threading.local()
+
+
+def metric_key(view, field):
+    return f'profiling:{view}:{field}'
+
+
+def bucket_field(index):
+    return f'bucket_{index}'
+
+
+def fingerprint(sql):
+    """ SQL без значений: одинаков у запросов, отличающихся параметрами. """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\((?:%s|\?)(?:\s*,\s*(?:%s|\?))*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def view_name(view_func, method):
+    """
+    Имя представления для меток: Класс.действие для ViewSet,
+    Класс для APIView и модуль.функция для остальных.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class RequestProfile:
+    """ Замеры одного запроса. """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = 'unresolved'
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.queries.append((sql, repr(params), duration))
+
+    @property
+    def duplicates(self):
+        return len(self.queries) - len({
+            (sql, params) for sql, params, _ in self.queries
+        })
+
+    def fingerprints(self):
+        """ Отпечатки запросов: (время, число, SQL) по убыванию времени. """
+        stats = defaultdict(lambda: [0.0, 0])
+        for sql, _, duration in self.queries:
+            item = stats[fingerprint(sql)]
+            item[0] += duration
+            item[1] += 1
+        return sorted(
+            ((total, count, sql) for sql, (total, count) in stats.items()),
+            reverse=True
+        )
+
+
+class MetricsRegistry:
+    """
+    Сводные метрики по представлениям.
+
+    Запрос добавляет замеры в счётчики своего процесса; раз в
+    PROFILING_FLUSH_INTERVAL секунд накопленное прибавляется к
+    счётчикам в кэше через cache.incr. Сумму по всем воркерам gunicorn
+    /api/metrics/ показывает только с общим кэшем (REDIS_URL): с кэшем
+    в памяти процесса каждый воркер отдаёт свои счётчики, и метрика
+    foodgram_metrics_shared равна 0.
+    """
+
+    def __init__(self, flush_interval=PROFILING_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._views = set()
+        self._flushed_at = time.monotonic()
+
+    def record(self, profile, wall_time):
+        values = {
+            'requests': 1,
+            'wall_us': int(wall_time * 1e6),
+            'db_us': int(profile.db_time * 1e6),
+            'queries': len(profile.queries),
+            'duplicates': profile.duplicates,
+            'serializer_us': int(profile.serializer_time * 1e6),
+        }
+        bucket = next(
+            (index for index, bound in enumerate(BUCKETS)
+             if wall_time <= bound),
+            len(BUCKETS)
+        )
+        values[bucket_field(bucket)] = 1
+        with self._lock:
+            self._views.add(profile.view)
+            for field, value in values.items():
+                self._pending[metric_key(profile.view, field)] += value
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            views = set(self._views)
+            self._flushed_at = time.monotonic()
+        known = cache.get(VIEWS_KEY) or set()
+        if not views <= known:
+            cache.set(VIEWS_KEY, known | views, timeout=None)
+        for key, value in pending.items():
+            if not value:
+                continue
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, value)
+
+    def collect(self):
+        """ Сводные значения: {представление: {поле: значение}}. """
+        self.flush()
+        views = sorted(cache.get(VIEWS_KEY) or ())
+        fields = FIELDS + tuple(
+            bucket_field(index) for index in range(len(BUCKETS) + 1)
+        )
+        values = cache.get_many([
+            metric_key(view, field) for view in views for field in fields
+        ])
+        return {
+            view: {
+                field: values.get(metric_key(view, field), 0)
+                for field in fields
+            }
+            for view in views
+        }
+
+
+registry = MetricsRegistry()
+
+
+def profiled_data(data):
+    """
+    BaseSerializer.data с замером времени. Вложенные вызовы .data
+    (например, в SerializerMethodField) в общее время не добавляются.
+    """
+    def wrapper(serializer):
+        profile = getattr(local, 'profile', None)
+        if profile is None or profile.serializer_depth:
+            return data.fget(serializer)
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            profile.serializer_time += time.perf_counter() - started
+            profile.serializer_depth -= 1
+    wrapper.profiled = True
+    return property(wrapper)
+
+
+def patch_serializers():
+    if not getattr(BaseSerializer.data.fget, 'profiled', False):
+        BaseSerializer.data = profiled_data(BaseSerializer.data)
+
+
+class ProfilingMiddleware:
+    """
+    Время ответа, время и число запросов к БД, повторы одинаковых
+    запросов и время сериализации по каждому представлению.
+
+    Включается переменной окружения PROFILING. Метрики отдаются в
+    формате Prometheus на /api/metrics/, заголовок Server-Timing -
+    при PROFILING_SERVER_TIMING, а медленные запросы (дольше
+    PROFILING_SLOW_MS) с долей PROFILING_SLOW_SAMPLE_RATE пишутся
+    в журнал вместе с отпечатками SQL.
+    """
+
+    def __init__(self, get_response):
+        if not PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        patch_serializers()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        local.profile = profile
+        for connection in connections.all():
+            connection.execute_wrappers.append(profile)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.finish(request, profile)
+            raise
+        if response.streaming:
+            # Строки выгрузки читаются из БД уже при отдаче ответа.
+            response.streaming_content = self.stream(
+                request, profile, response.streaming_content
+            )
+        else:
+            self.finish(request, profile)
+        if PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(local, 'profile', None)
+        if profile is not None:
+            profile.view = view_name(view_func, request.method)
+
+    def stream(self, request, profile, content):
+        try:
+            yield from content
+        finally:
+            self.finish(request, profile)
+
+    def finish(self, request, profile):
+        for connection in connections.all():
+            if profile in connection.execute_wrappers:
+                connection.execute_wrappers.remove(profile)
+        if getattr(local, 'profile', None) is profile:
+            local.profile = None
+        wall_time = time.perf_counter() - profile.started
+        registry.record(profile, wall_time)
+        if (wall_time * 1000 >= PROFILING_SLOW_MS
+                and random.random() < PROFILING_SLOW_SAMPLE_RATE):
+            self.log_slow(request, profile, wall_time)
+
+    def server_timing(self, profile):
+        wall_time = time.perf_counter() - profile.started
+        return ', '.join((
+            f'db;desc="{len(profile.queries)} queries";'
+            f'dur={profile.db_time * 1000:.1f}',
+            f'serializer;dur={profile.serializer_time * 1000:.1f}',
+            f'total;dur={wall_time * 1000:.1f}',
+        ))
+
+    def log_slow(self, request, profile, wall_time):
+        lines = [
+            f'{request.method} {request.get_full_path()} ({profile.view}): '
+            f'{wall_time * 1000:.0f} ms, db {profile.db_time * 1000:.0f} ms, '
+            f'{len(profile.queries)} queries, '
+            f'{profile.duplicates} duplicates, '
+            f'serializer {profile.serializer_time * 1000:.0f} ms'
+        ]
+        for total, count, sql in profile.fingerprints()[:10]:
+            digest = hashlib.md5(sql.encode()).hexdigest()[:12]
+            lines.append(
+                f'  {total * 1000:8.1f} ms  x{count:<4} [{digest}] {sql[:500]}'
+            )
+        logger.warning('\n'.join(lines))
+
+
+def render_metrics():
+    """ Метрики в текстовом формате Prometheus. """
+    lines = []
+
+    def family(name, kind, description):
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    metrics = registry.collect()
+    counters = (
+        ('foodgram_db_seconds_total', 'db_us', 1e6,
+         'Время запросов к БД.'),
+        ('foodgram_db_queries_total', 'queries', 1,
+         'Число запросов к БД.'),
+        ('foodgram_db_duplicate_queries_total', 'duplicates', 1,
+         'Повторы одинаковых запросов к БД в пределах HTTP-запроса.'),
+        ('foodgram_serializer_seconds_total', 'serializer_us', 1e6,
+         'Время сериализации ответа, включая запросы к БД из неё.'),
+    )
+    family('foodgram_request_seconds', 'histogram', 'Время ответа.')
+    for view, values in metrics.items():
+        cumulative = 0
+        for index, bound in enumerate(BUCKETS + ('+Inf',)):
+            cumulative += values[bucket_field(index)]
+            lines.append(
+                f'foodgram_request_seconds_bucket'
+                f'{{view="{view}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(
+            f'foodgram_request_seconds_sum{{view="{view}"}} '
+            f'{values["wall_us"] / 1e6}'
+        )
+        lines.append(
+            f'foodgram_request_seconds_count{{view="{view}"}} '
+            f'{values["requests"]}'
+        )
+    for name, field, scale, description in counters:
+        family(name, 'counter', description)
+        for view, values in metrics.items():
+            value = values[field] / scale if scale != 1 else values[field]
+            lines.append(f'{name}{{view="{view}"}} {value}')
+
+    family('foodgram_metrics_shared', 'gauge',
+           '1 - счётчики общие для всех процессов, 0 - только этого '
+           'процесса (нет общего кэша).')
+    lines.append(f'foodgram_metrics_shared {int(API_CACHE_SHARED)}')
+
+    stats = cache.get_many((HITS_KEY, MISSES_KEY))
+    family('foodgram_api_cache_hits_total', 'counter',
+           'Ответы из кэша API.')
+    lines.append(f'foodgram_api_cache_hits_total {stats.get(HITS_KEY, 0)}')
+    family('foodgram_api_cache_misses_total', 'counter',
+           'Промахи кэша API.')
+    lines.append(
+        f'foodgram_api_cache_misses_total {stats.get(MISSES_KEY, 0)}'
+    )
+    return '\n'.join(lines) + '\n'
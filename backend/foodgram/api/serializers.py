@@ -2,12 +2,14 @@ from django.core.validators import MinValueValidator
 from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
-from drf_base64.fields import Base64ImageField
 
 from foodgram.settings import MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT
+from api.fields import ImageURLField, RecipeImageField
 from users.serializers import UserSerializer
+from recipes.images import schedule_variants
 from recipes.models import (Recipe, Ingredient, Tag, IngredientRecipe,
-                            TagRecipe, Favorite, ShoppingList)
+                            TagRecipe, Favorite, ShoppingList,
+                            ShoppingCartItem)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -32,9 +34,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class ChooseIngredientsForRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         validators=(
             MinValueValidator(
@@ -72,7 +72,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         many=True
     )
     author = serializers.SlugRelatedField(read_only=True, slug_field='email')
-    image = Base64ImageField(required=False)
+    image = RecipeImageField(required=False)
     cooking_time = serializers.IntegerField(
         validators=(
             MinValueValidator(
@@ -88,66 +88,120 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                   'image', 'name', 'text', 'cooking_time')
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.for_serialization(
+            request.user).get(pk=instance.pk)
         serializer = GetRecipeSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         )
         return serializer.data
 
+    def validate_ingredients(self, value):
+        ingredient_ids = [item['id'] for item in value]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                'Выбранный ингредиент уже добавлен.')
+        missing_ids = set(ingredient_ids) - set(
+            Ingredient.objects.filter(
+                id__in=ingredient_ids).values_list('id', flat=True)
+        )
+        if missing_ids:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing_ids)}')
+        return value
+
+    def set_tags(self, recipe, tags, created=False):
+        """ Записывает теги рецепта, меняя только изменившиеся строки. """
+        tag_ids = {tag.id for tag in tags}
+        current_ids = set()
+        if not created:
+            current_ids = set(TagRecipe.objects.filter(
+                recipe=recipe).values_list('tag_id', flat=True))
+            removed_ids = current_ids - tag_ids
+            if removed_ids:
+                TagRecipe.objects.filter(
+                    recipe=recipe, tag_id__in=removed_ids).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id)
+            for tag_id in tag_ids - current_ids
+        )
+
+    def set_ingredients(self, recipe, ingredients, created=False):
+        """ Записывает ингредиенты, меняя только изменившиеся строки. """
+        amounts = {
+            item['id']: item['amount'] for item in ingredients
+        }
+        current = {}
+        if not created:
+            current = {
+                row.ingredient_id: row
+                for row in IngredientRecipe.objects.filter(recipe=recipe)
+            }
+            removed_ids = current.keys() - amounts.keys()
+            if removed_ids:
+                IngredientRecipe.objects.filter(
+                    recipe=recipe, ingredient_id__in=removed_ids).delete()
+        changed = []
+        deltas = {}
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id, 0)
+            if row.amount != amount:
+                deltas[ingredient_id] = amount - row.amount
+                if amount:
+                    row.amount = amount
+                    changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+        if not created:
+            deltas.update(
+                (ingredient_id, amount)
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in current
+            )
+            ShoppingCartItem.objects.apply_recipe_changes(recipe, deltas)
+
     @transaction.atomic()
     def create(self, validated_data):
         current_user = self.context.get('request').user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipeingredient')
         recipe = Recipe.objects.create(author=current_user, **validated_data)
-        for tag in tags:
-            TagRecipe.objects.create(recipe=recipe, tag=tag)
-        for ingredient in ingredients:
-            current_ingredient = ingredient.get('id')
-            if IngredientRecipe.objects.filter(
-                    recipe=recipe,
-                    ingredient=current_ingredient).exists():
-                raise serializers.ValidationError(
-                    'Выбранный ингредиент уже добавлен.')
-            amount = ingredient.get('amount')
-            IngredientRecipe.objects.create(
-                recipe=recipe,
-                ingredient=current_ingredient,
-                amount=amount
-            )
+        self.set_tags(recipe, tags, created=True)
+        self.set_ingredients(recipe, ingredients, created=True)
+        if recipe.image:
+            schedule_variants(recipe.id)
         return recipe
 
     @transaction.atomic()
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('recipeingredient')
-        instance.tags.clear()
-        instance.ingredients.clear()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        TagRecipe.objects.filter(recipe=instance).delete()
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('recipeingredient', None)
         instance = super().update(instance, validated_data)
-        for tag in tags:
-            TagRecipe.objects.create(recipe=instance, tag=tag)
-        for ingredient in ingredients:
-            current_ingredient = ingredient.get('id')
-            amount = ingredient.get('amount')
-            if IngredientRecipe.objects.filter(
-                    recipe=instance,
-                    ingredient=current_ingredient).exists():
-                raise serializers.ValidationError(
-                    'Выбранный ингредиент уже добавлен.')
-            IngredientRecipe.objects.create(
-                recipe=instance,
-                ingredient=current_ingredient,
-                amount=amount
-            )
-        instance.save()
+        if 'image' in validated_data:
+            schedule_variants(instance.id)
+        if tags is not None:
+            self.set_tags(instance, tags)
+        if ingredients is not None:
+            self.set_ingredients(instance, ingredients)
         return instance
 
 
 class GetRecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer()
-    image = Base64ImageField()
+    image = ImageURLField()
+    thumbnail = ImageURLField()
+    image_webp = ImageURLField()
+    image_placeholder = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited'
     )
@@ -164,9 +218,15 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'thumbnail', 'image_webp',
+                  'image_placeholder', 'text', 'cooking_time')
+
+    def get_image_placeholder(self, obj):
+        return obj.image_placeholder or None
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         if self.context.get('request').user.is_authenticated:
             user = self.context.get('request').user
             return Favorite.objects.filter(
@@ -176,6 +236,8 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.context.get('request').user.is_authenticated:
             user = self.context.get('request').user
             return ShoppingList.objects.filter(
@@ -185,6 +247,13 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         return False
 
 
+class CookableRecipeSerializer(GetRecipeSerializer):
+    missing_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(GetRecipeSerializer.Meta):
+        fields = GetRecipeSerializer.Meta.fields + ('missing_ingredients',)
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     user = UserSerializer
     recipe = GetRecipeSerializer
@@ -0,0 +1,845 @@
+import base64
+import csv
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.cache import get_stats
+from api.exporters import TextRenderer
+from api.fields import RecipeImageField
+from api.pagination import KeysetPagination
+from api.serializers import GetRecipeSerializer
+from recipes.autocomplete import ingredient_catalog
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCartItem, ShoppingList, Tag, TagRecipe)
+from users.models import Follow, User
+
+PAGE_SIZES = (6, 60, 600)
+AUTHORS = 6
+
+# Число запросов не зависит от размера страницы: рецепты, авторы
+# с is_subscribed, теги и ингредиенты читаются по одному запросу.
+SERIALIZATION_QUERIES = 4
+# Аутентификация по токену и COUNT(*) для пагинации.
+RECIPE_LIST_QUERIES = SERIALIZATION_QUERIES + 2
+# Аутентификация и рецепт с автором, тегами и ингредиентами.
+RETRIEVE_QUERIES = SERIALIZATION_QUERIES + 1
+# Аутентификация, COUNT(*), авторы страницы, их рецепты.
+SUBSCRIPTIONS_QUERIES = 4
+
+
+@mock.patch('api.cache.API_CACHE_SHARED', False)
+class QueryBudgetTests(TestCase):
+    """
+    Число запросов к БД при чтении страниц из 6, 60 и 600 рецептов:
+    N+1 в сериализаторах делает его зависимым от размера страницы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Читатель'
+        )
+        # bulk_create в SQLite не возвращает id: объекты перечитываются.
+        User.objects.bulk_create(
+            User(
+                email=f'author{index}@example.com',
+                username=f'author{index}',
+                first_name='Автор', last_name=str(index)
+            )
+            for index in range(AUTHORS)
+        )
+        authors = list(User.objects.exclude(pk=cls.user.pk).order_by('pk'))
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, following=author) for author in authors
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', slug=f'tag{index}', color='#FFFFFF')
+            for index in range(3)
+        )
+        tags = list(Tag.objects.order_by('pk'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(10)
+        )
+        ingredients = list(Ingredient.objects.order_by('pk'))
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[index % AUTHORS],
+                name=f'Рецепт {index}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/test.png'
+            )
+            for index in range(max(PAGE_SIZES))
+        )
+        recipes = list(Recipe.objects.order_by('pk'))
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag=tags[index % len(tags)])
+            for index, recipe in enumerate(recipes)
+        )
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient=ingredients[(index + step) % len(ingredients)],
+                amount=100
+            )
+            for index, recipe in enumerate(recipes)
+            for step in range(3)
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::2]
+        )
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=cls.user, recipe=recipe)
+            for recipe in recipes[::3]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # force_authenticate не читает токен: запрос аутентификации
+        # из бюджетов вычитается.
+        self.auth_queries = 1
+
+    def test_for_serialization(self):
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = self.user
+        for size in PAGE_SIZES:
+            with self.subTest(size=size):
+                with self.assertNumQueries(SERIALIZATION_QUERIES):
+                    data = GetRecipeSerializer(
+                        Recipe.objects.for_serialization(self.user)[:size],
+                        many=True,
+                        context={'request': request}
+                    ).data
+                self.assertEqual(len(data), size)
+                self.assertTrue(data[0]['author']['is_subscribed'])
+                self.assertEqual(len(data[0]['ingredients']), 3)
+
+    def test_with_user_flags(self):
+        for size in PAGE_SIZES:
+            with self.subTest(size=size):
+                with self.assertNumQueries(1):
+                    recipes = list(
+                        Recipe.objects.with_user_flags(self.user)[:size]
+                    )
+                self.assertEqual(len(recipes), size)
+                self.assertEqual(
+                    sum(recipe.is_favorited for recipe in recipes),
+                    (size + 1) // 2
+                )
+
+    @mock.patch.object(KeysetPagination, 'max_page_size', max(PAGE_SIZES))
+    def test_recipe_list(self):
+        for size in PAGE_SIZES:
+            with self.subTest(size=size):
+                with self.assertNumQueries(
+                        RECIPE_LIST_QUERIES - self.auth_queries):
+                    response = self.client.get(
+                        '/api/recipes/',
+                        {'pagination': 'cursor', 'limit': size}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), size)
+
+    def test_recipe_list_pages(self):
+        for size in PAGE_SIZES:
+            with self.subTest(size=size):
+                with mock.patch.object(
+                        PageNumberPagination, 'page_size', size):
+                    with self.assertNumQueries(
+                            RECIPE_LIST_QUERIES - self.auth_queries):
+                        # Последняя страница: OFFSET по всей выборке.
+                        response = self.client.get(
+                            '/api/recipes/',
+                            {'page': max(PAGE_SIZES) // size}
+                        )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), size)
+
+    def test_recipe_retrieve(self):
+        recipe = Recipe.objects.order_by('pk').first()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag=tag)
+            for tag in Tag.objects.exclude(recipes=recipe)
+        )
+        with self.assertNumQueries(RETRIEVE_QUERIES - self.auth_queries):
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['tags']), 3)
+        self.assertEqual(len(response.data['ingredients']), 3)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_subscriptions(self):
+        for size in PAGE_SIZES:
+            with self.subTest(size=size):
+                with self.assertNumQueries(
+                        SUBSCRIPTIONS_QUERIES - self.auth_queries):
+                    response = self.client.get(
+                        '/api/users/subscriptions/',
+                        {'recipes_limit': size}
+                    )
+                self.assertEqual(response.status_code, 200)
+                shown = sum(
+                    len(author['recipes'])
+                    for author in response.data['results']
+                )
+                self.assertEqual(
+                    shown,
+                    min(size, max(PAGE_SIZES) // AUTHORS) * AUTHORS
+                )
+
+
+class RecipeImageFieldTests(TestCase):
+    """ Проверки картинки одинаковы для base64 и multipart-файла. """
+
+    def upload(self, size=(10, 10)):
+        content = BytesIO()
+        Image.new('RGB', size).save(content, format='PNG')
+        return SimpleUploadedFile(
+            'image.png', content.getvalue(), content_type='image/png')
+
+    def test_uploaded_file(self):
+        field = RecipeImageField()
+        self.assertEqual(field.to_internal_value(self.upload()).size,
+                         self.upload().size)
+
+    def test_uploaded_file_too_large(self):
+        upload = self.upload()
+        with mock.patch('api.fields.RECIPE_IMAGE_MAX_SIZE', upload.size - 1):
+            with mock.patch('api.fields.Image.open') as image_open:
+                with self.assertRaises(ValidationError):
+                    RecipeImageField().to_internal_value(upload)
+        image_open.assert_not_called()
+
+    def test_uploaded_file_too_wide(self):
+        upload = self.upload(size=(20, 10))
+        with mock.patch('api.fields.RECIPE_IMAGE_MAX_DIMENSION', 19):
+            with self.assertRaises(ValidationError):
+                RecipeImageField().to_internal_value(upload)
+
+    def encoded(self):
+        return base64.b64encode(self.upload().read()).decode()
+
+    @mock.patch('api.fields.DECODE_CHUNK_SIZE', 8)
+    def test_base64_chunks(self):
+        encoded = self.encoded()
+        # Пробелы и переносы дальше первого куска тоже убираются.
+        spaced = encoded[:16] + ' \n' + encoded[16:-8] + '\n' + encoded[-8:]
+        image = RecipeImageField().to_internal_value(
+            f'data:image/png;base64,{spaced}')
+        self.assertEqual(image.read(), self.upload().read())
+
+    @mock.patch('api.fields.DECODE_CHUNK_SIZE', 8)
+    def test_base64_malformed_tail(self):
+        encoded = self.encoded()
+        for tail in ('!!!!', '====', encoded[-8:-1]):
+            with self.subTest(tail=tail):
+                with self.assertRaises(ValidationError):
+                    RecipeImageField().to_internal_value(
+                        f'data:image/png;base64,{encoded[:-8]}{tail}')
+
+
+@mock.patch('api.cache.API_CACHE_SHARED', True)
+class ResponseCacheTests(TestCase):
+    """ ETag и кэш ответов меняются вместе с данными, от которых зависят. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Читатель'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, params=None, **headers):
+        return APIClient().get(path, params, **headers)
+
+    def test_anonymous_response_cache(self):
+        first = self.get('/api/recipes/')
+        second = self.get('/api/recipes/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(get_stats()['hits'], 1)
+        self.assertEqual(get_stats()['misses'], 1)
+
+        recipe = self.recipes[0]
+        recipe.name = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        response = self.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['name'], 'Новое название')
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'MISS')
+
+    def test_cache_scopes(self):
+        self.assertEqual(self.get('/api/tags/')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/tags/')['X-Cache'], 'HIT')
+        # Изменение ингредиента не трогает ответы со списком тегов.
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.assertEqual(self.get('/api/tags/')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Завтрак', slug='breakfast',
+                               color='#FFFFFF')
+        response = self.get('/api/tags/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 1)
+
+    def test_authenticated_responses_are_not_cached(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for _ in range(2):
+            response = client.get('/api/recipes/')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Cache', response)
+
+    def test_conditional_get(self):
+        for path in ('/api/recipes/', f'/api/recipes/{self.recipes[0].pk}/',
+                     '/api/tags/', '/api/ingredients/'):
+            with self.subTest(path=path):
+                response = self.get(path)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                # Штампы уже в кэше: 304 без запросов к БД и сериализации.
+                with self.assertNumQueries(0):
+                    response = self.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_after_write(self):
+        path = f'/api/recipes/{self.recipes[0].pk}/'
+        response = self.get(path)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        self.assertEqual(
+            self.get(path, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+            304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.create(
+                recipe=self.recipes[0],
+                ingredient=Ingredient.objects.create(
+                    name='соль', measurement_unit='г'),
+                amount=5
+            )
+        response = self.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['ingredients']), 1)
+
+    def test_etag_per_user(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        path = f'/api/recipes/{self.recipes[0].pk}/'
+        anonymous = self.get(path)['ETag']
+        etag = client.get(path)['ETag']
+        self.assertNotEqual(etag, anonymous)
+        # Отметка "в избранном" входит в ответ пользователю.
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_popular_ordering_after_favorite(self):
+        response = self.get('/api/recipes/', {'ordering': 'popular'})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        oldest = self.recipes[0]
+        self.assertNotEqual(response.data['results'][0]['id'], oldest.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=oldest)
+
+        response = self.get(
+            '/api/recipes/', {'ordering': 'popular'},
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['id'], oldest.pk)
+
+
+class RecipeWriteTests(TestCase):
+    """
+    Запись рецепта: теги и ингредиенты пишутся пачками, при изменении
+    трогаются только изменившиеся строки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Автор'
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', slug=f'tag{index}', color='#FFFFFF')
+            for index in range(3)
+        )
+        cls.tags = list(Tag.objects.order_by('pk'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(30)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('pk'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def recipe_data(self, ingredients, tags):
+        return {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': [tag.pk for tag in tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient, amount in ingredients
+            ],
+        }
+
+    def create_recipe(self, ingredients, tags):
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(ingredients, tags),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Recipe.objects.get(pk=response.data['id'])
+
+    def rows(self, recipe):
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+
+    def test_create_queries_do_not_grow_with_rows(self):
+        counts = []
+        for size in (3, len(self.ingredients)):
+            ingredients = [
+                (ingredient, 10) for ingredient in self.ingredients[:size]
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                recipe = self.create_recipe(ingredients, self.tags[:size])
+            self.assertEqual(len(self.rows(recipe)), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_update_changes_only_changed_rows(self):
+        first, second, third, fourth = self.ingredients[:4]
+        recipe = self.create_recipe(
+            ((first, 100), (second, 50), (third, 10)), self.tags[:2]
+        )
+        rows = self.rows(recipe)
+        kept_tag = TagRecipe.objects.get(recipe=recipe, tag=self.tags[0])
+
+        response = self.client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            self.recipe_data(
+                ((first, 100), (second, 70), (fourth, 5)),
+                (self.tags[0], self.tags[2])
+            ),
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        updated = self.rows(recipe)
+        self.assertEqual(updated[first.pk], rows[first.pk])
+        self.assertEqual(updated[second.pk], (rows[second.pk][0], 70))
+        self.assertNotIn(third.pk, updated)
+        self.assertEqual(updated[fourth.pk][1], 5)
+        self.assertEqual(
+            set(TagRecipe.objects.filter(recipe=recipe).values_list(
+                'tag', flat=True)),
+            {self.tags[0].pk, self.tags[2].pk}
+        )
+        self.assertTrue(TagRecipe.objects.filter(pk=kept_tag.pk).exists())
+
+    def test_duplicate_ingredients(self):
+        ingredient = self.ingredients[0]
+        response = self.client.post(
+            '/api/recipes/',
+            self.recipe_data(((ingredient, 10), (ingredient, 20)),
+                             self.tags[:1]),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class UpperCaseRenderer(TextRenderer):
+    def render(self, items):
+        for line in super().render(items):
+            yield line.upper()
+
+
+class ShoppingCartExportTests(TestCase):
+    """ Выгрузка списка покупок потоком в txt, csv, pdf и своих форматах. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='buyer@example.com', username='buyer',
+            first_name='Покупатель', last_name='Покупатель'
+        )
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        sugar, flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('сахар', 'мука')
+        )
+        IngredientRecipe.objects.bulk_create((
+            IngredientRecipe(recipe=recipe, ingredient=sugar, amount=50),
+            IngredientRecipe(recipe=recipe, ingredient=flour, amount=200),
+        ))
+        ShoppingList.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format=None):
+        params = {'file_format': file_format} if file_format else {}
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/', params)
+
+    def test_text(self):
+        response = self.download()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('ShoppingCart.txt', response['Content-Disposition'])
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            'мука: 200г\nсахар: 50г\n'
+        )
+
+    def test_csv(self):
+        response = self.download('csv')
+        rows = list(csv.reader(StringIO(
+            b''.join(response.streaming_content).decode().lstrip('\ufeff')
+        )))
+        self.assertEqual(rows, [
+            ['Ингредиент', 'Количество', 'Единица'],
+            ['мука', '200', 'г'],
+            ['сахар', '50', 'г'],
+        ])
+
+    def test_pdf(self):
+        response = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_pluggable_renderer(self):
+        renderers = {'upper': 'api.tests.UpperCaseRenderer'}
+        with mock.patch('api.exporters.SHOPPING_CART_RENDERERS', renderers):
+            response = self.download('upper')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            'МУКА: 200Г\nСАХАР: 50Г\n'
+        )
+
+    def test_unknown_format(self):
+        response = self.download('docx')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.data)
+
+
+class ShoppingCartTotalsTests(TestCase):
+    """
+    Суммы в ShoppingCartItem следуют за списком покупок и составом
+    рецептов в нём и совпадают с пересчётом по спискам.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.buyer = (
+            User.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name
+            )
+            for name in ('author', 'buyer')
+        )
+        cls.flour, cls.sugar, cls.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар', 'соль')
+        )
+        cls.bread, cls.cake = (
+            Recipe.objects.create(
+                author=cls.author, name=name, text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+            for name in ('Хлеб', 'Торт')
+        )
+        IngredientRecipe.objects.bulk_create((
+            IngredientRecipe(
+                recipe=cls.bread, ingredient=cls.flour, amount=500),
+            IngredientRecipe(recipe=cls.bread, ingredient=cls.salt, amount=5),
+            IngredientRecipe(
+                recipe=cls.cake, ingredient=cls.flour, amount=200),
+            IngredientRecipe(
+                recipe=cls.cake, ingredient=cls.sugar, amount=100),
+        ))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        for recipe in (self.bread, self.cake):
+            response = self.client.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+
+    def totals(self):
+        totals = dict(ShoppingCartItem.objects.filter(
+            user=self.buyer).values_list('ingredient__name', 'total_amount'))
+        expected = {
+            (item['user'], item['ingredient']): item['total_amount']
+            for item in ShoppingCartItem.objects.expected_totals()
+        }
+        self.assertEqual(
+            expected,
+            {
+                (item.user_id, item.ingredient_id): item.total_amount
+                for item in ShoppingCartItem.objects.all()
+            }
+        )
+        return totals
+
+    def test_add_recipes(self):
+        self.assertEqual(
+            self.totals(), {'мука': 700, 'соль': 5, 'сахар': 100})
+
+    def test_remove_recipe(self):
+        response = self.client.delete(
+            f'/api/recipes/{self.bread.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals(), {'мука': 200, 'сахар': 100})
+
+    def test_patch_recipe(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{self.cake.pk}/',
+            {'ingredients': [
+                {'id': self.flour.pk, 'amount': 300},
+                {'id': self.salt.pk, 'amount': 1},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.totals(), {'мука': 800, 'соль': 6})
+
+    def test_delete_recipe(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.delete(f'/api/recipes/{self.bread.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals(), {'мука': 200, 'сахар': 100})
+
+
+class IngredientAutocompleteTests(TestCase):
+    """
+    Автодополнение по ?name= в обоих режимах: из кэша в памяти и
+    по индексу в БД.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Мука сорт {index:02}', measurement_unit='г')
+            for index in range(30)
+        )
+        Ingredient.objects.create(name='сахар', measurement_unit='г')
+
+    def setUp(self):
+        ingredient_catalog.invalidate()
+
+    def search(self, name):
+        response = APIClient().get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def test_limit_and_prefix(self):
+        for use_cache in (False, True):
+            with self.subTest(cache=use_cache):
+                with mock.patch(
+                        'api.views.INGREDIENT_AUTOCOMPLETE_CACHE', use_cache):
+                    with mock.patch(
+                            'api.views.INGREDIENT_AUTOCOMPLETE_LIMIT', 5):
+                        names = self.search('Мука')
+                        self.assertEqual(len(names), 5)
+                        self.assertTrue(all(
+                            name.startswith('Мука') for name in names))
+                        self.assertEqual(self.search('сах'), ['сахар'])
+                        self.assertEqual(self.search('соль'), [])
+
+    @mock.patch('api.views.INGREDIENT_AUTOCOMPLETE_CACHE', True)
+    def test_cache_follows_ingredient_changes(self):
+        # LIKE в SQLite не сравнивает кириллицу без учёта регистра,
+        # поэтому регистр проверяется только на кэше.
+        self.assertEqual(self.search('САХ'), ['сахар'])
+        self.assertEqual(self.search('соль'), [])
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.assertEqual(self.search('соль'), ['соль'])
+
+
+@mock.patch('api.cache.API_CACHE_SHARED', False)
+class KeysetPaginationTests(TestCase):
+    """
+    Пагинация по курсору: страницы без пропусков и повторов при
+    фильтрах и составных сортировках, ошибки неверного курсора.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Автор'
+        )
+        cls.breakfast, cls.dinner = (
+            Tag.objects.create(name=name, slug=slug, color='#FFFFFF')
+            for name, slug in (('Завтрак', 'breakfast'), ('Ужин', 'dinner'))
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.author, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png',
+                # Повторяющиеся значения: курсор продолжается по pk.
+                favorites_count=index % 4
+            )
+            for index in range(25)
+        )
+        cls.recipes = list(Recipe.objects.order_by('pk'))
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag=cls.breakfast)
+            for recipe in cls.recipes[::2]
+        )
+
+    def walk(self, params):
+        """ Проходит страницы по ссылкам next и собирает id. """
+        client = APIClient()
+        response = client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 4, **params})
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 4)
+            ids.extend(item['id'] for item in response.data['results'])
+            if response.data['next'] is None:
+                return ids, response.data['count']
+            response = client.get(response.data['next'])
+
+    def test_pages_follow_ordering(self):
+        ids, count = self.walk({})
+        self.assertEqual(
+            ids, [recipe.pk for recipe in reversed(self.recipes)])
+        self.assertEqual(count, len(self.recipes))
+
+    def test_compound_ordering_with_filter(self):
+        ids, count = self.walk({'ordering': 'popular', 'tags': 'breakfast'})
+        expected = sorted(
+            self.recipes[::2],
+            key=lambda recipe: (-recipe.favorites_count, -recipe.pk)
+        )
+        self.assertEqual(ids, [recipe.pk for recipe in expected])
+        self.assertEqual(count, len(expected))
+
+    @mock.patch.object(KeysetPagination, 'count_mode', 'none')
+    def test_without_count(self):
+        ids, count = self.walk({})
+        self.assertEqual(len(ids), len(self.recipes))
+        self.assertIsNone(count)
+
+    def test_limit_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 3):
+            response = APIClient().get(
+                '/api/recipes/', {'pagination': 'cursor', 'limit': 100})
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_bad_cursor(self):
+        wrong_length = KeysetPagination().encode_cursor([1, 2, 3])
+        for cursor in ('не-курсор', 'bm90IGpzb24=', wrong_length):
+            with self.subTest(cursor=cursor):
+                response = APIClient().get(
+                    '/api/recipes/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+@mock.patch('api.cache.API_CACHE_SHARED', False)
+class TagFilterTests(TestCase):
+    """ Фильтр по нескольким тегам не дублирует рецепты. """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Автор'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', slug=f'tag{index}', color='#FFFFFF')
+            for index in range(3)
+        ]
+        cls.both, cls.first, cls.untagged = (
+            Recipe.objects.create(
+                author=author, name=name, text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+            for name in ('Оба тега', 'Первый тег', 'Без тегов')
+        )
+        TagRecipe.objects.bulk_create((
+            TagRecipe(recipe=cls.both, tag=cls.tags[0]),
+            TagRecipe(recipe=cls.both, tag=cls.tags[1]),
+            TagRecipe(recipe=cls.first, tag=cls.tags[0]),
+        ))
+
+    def filter(self, *slugs):
+        return APIClient().get('/api/recipes/', {'tags': slugs})
+
+    def test_several_tags(self):
+        response = self.filter('tag0', 'tag1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.first.pk, self.both.pk]
+        )
+
+    def test_single_and_empty_tags(self):
+        self.assertEqual(
+            [item['id'] for item in self.filter('tag1').data['results']],
+            [self.both.pk]
+        )
+        self.assertEqual(self.filter('tag2').data['count'], 0)
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.filter('missing').status_code, 400)
+
+    def test_unique_tag_recipe(self):
+        with self.assertRaises(IntegrityError):
+            TagRecipe.objects.create(recipe=self.first, tag=self.tags[0])
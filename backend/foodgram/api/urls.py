@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 
 from users.views import CustomUserViewSet
 from api.views import (RecipeViewSet, TagViewSet, IngredientViewSet,
-                       FavoriteViewSet, ShoppingListViewSet)
+                       FavoriteViewSet, ShoppingListViewSet, CacheStatsView,
+                       MetricsView)
 
 
 v1_router = DefaultRouter()
@@ -18,6 +19,8 @@ v1_router.register('shopping_cart', ShoppingListViewSet, basename='shopping_cart
 
 
 urlpatterns = [
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(v1_router.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,42 +1,85 @@
-from django.db.models import Sum
-from django.shortcuts import get_object_or_404, HttpResponse
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.pagination import PageNumberPagination
 from rest_framework import viewsets, status, filters
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.views import APIView
 
-from foodgram.settings import FILE_NAME, CONTENT_TYPE
+from foodgram.settings import (COOKABLE_MAX_MISSING,
+                               INGREDIENT_AUTOCOMPLETE_CACHE,
+                               INGREDIENT_AUTOCOMPLETE_LIMIT,
+                               SHOPPING_CART_CHUNK_SIZE,
+                               SHOPPING_CART_DEFAULT_FORMAT,
+                               SHOPPING_CART_FILE_NAME)
 from users.serializers import RecipeInfoSerializer
-from recipes.models import (Recipe, Ingredient, Tag, Favorite, ShoppingList)
+from recipes.autocomplete import ingredient_catalog
+from recipes.cookable import cookable_index
+from recipes.models import (Recipe, Ingredient, Tag, Favorite, ShoppingList,
+                            ShoppingCartItem)
 from api.serializers import (CreateRecipeSerializer, TagSerializer,
                              IngredientSerializer,
                              GetRecipeSerializer, FavoriteSerializer,
-                             ShoppingListSerializer)
-from api.permissions import IsAuthorOrReadOnly
-from api.filters import CustomFilter, CustomSearchFilter
+                             ShoppingListSerializer,
+                             CookableRecipeSerializer)
+from api.permissions import IsAuthorOrReadOnly, IsInternalOrAdmin
+from api.filters import CustomFilter, CustomSearchFilter, RECIPE_ORDERINGS
+from api.exporters import get_renderer
+from api.cache import CachedResponseMixin, get_stats
+from api.pagination import KeysetPagination, RecipePagination
+from api.profiling import render_metrics
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """ CRUD операции с рецептом/списком рецептов. """
+    cache_scopes = ('recipe', 'tag', 'ingredient')
     queryset = Recipe.objects.all()
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CustomFilter
     permission_classes = (IsAuthorOrReadOnly,)
 
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.for_serialization(self.request.user)
+        return Recipe.objects.with_user_flags(self.request.user)
+
+    def get_ordering(self):
+        """
+        Сортировка из параметра ordering; при поиске без него - по
+        релевантности, иначе от новых рецептов к старым.
+        """
+        ordering = self.request.query_params.get('ordering')
+        if ordering in RECIPE_ORDERINGS:
+            return RECIPE_ORDERINGS[ordering]
+        if self.request.query_params.get('search'):
+            return ('-search_rank', '-pk')
+        return RECIPE_ORDERINGS['newest']
+
+    def get_cache_scopes(self, request):
+        scopes = super().get_cache_scopes(request)
+        # Порядок по счётчикам меняется без изменения самих рецептов.
+        if request.query_params.get('ordering') == 'popular':
+            scopes.append('recipe_counters')
+        return scopes
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH', 'DELETE'):
             return CreateRecipeSerializer
         return GetRecipeSerializer
 
+    @transaction.atomic()
     def create_object(self, model, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
         model.objects.create(user=self.request.user, recipe=recipe)
         serializer = RecipeInfoSerializer(recipe, context={'request': request})
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic()
     def delete_object(self, model, pk):
         instance = model.objects.filter(user=self.request.user, recipe__id=pk)
         if instance.exists():
@@ -72,45 +115,147 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        url_path='download_shopping_cart'
+        url_path='feed',
+        permission_classes=(IsAuthenticated,)
     )
-    def download_shopping_cart(self, request):
-        ingredients = Recipe.objects.prefetch_related(
-            'ingredients', 'recipeingredient'
-        ).filter(shoppinglist__user=request.user
-        ).order_by('ingredients__name'
-        ).values('ingredients__name', 'ingredients__measurement_unit'
-        ).annotate(total_sum=Sum('recipeingredient__amount')
+    def feed(self, request):
+        """ Рецепты авторов из подписок, от новых к старым, по курсору. """
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(
+            Recipe.objects.for_serialization(request.user).feed(
+                request.user),
+            request
         )
+        serializer = GetRecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, url_path='cookable')
+    def cookable(self, request):
+        """
+        Рецепты, которые можно приготовить из ингредиентов
+        (ingredients=1,2 или ingredients=1&ingredients=2), если не
+        хватает не больше missing ингредиентов. Сначала рецепты,
+        где не хватает меньше всего.
+        """
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            }
+            missing = int(request.query_params.get('missing', 0))
+        except ValueError:
+            return Response(
+                {'errors': 'Ингредиенты и missing должны быть числами.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите хотя бы один ингредиент.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 <= missing <= COOKABLE_MAX_MISSING:
+            return Response(
+                {'errors': f'missing должен быть от 0 до '
+                           f'{COOKABLE_MAX_MISSING}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        matches = cookable_index.match(ingredient_ids, missing)
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        recipes = Recipe.objects.for_serialization(request.user).in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        result = []
+        for recipe_id, _, missing_count in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.missing_ingredients = missing_count
+                result.append(recipe)
+        serializer = CookableRecipeSerializer(
+            result, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
 
-        ingredient_txt = [
-            (
-                f"{item['ingredients__name']}: "
-                f"{item['total_sum']}{item['ingredients__measurement_unit']}\n"
+    @action(
+        detail=False,
+        url_path='download_shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def download_shopping_cart(self, request):
+        """
+        Выгружает список покупок в формате из параметра file_format
+        (txt, csv, pdf). Строки читаются курсором и отдаются потоком.
+        """
+        file_format = request.query_params.get(
+            'file_format', SHOPPING_CART_DEFAULT_FORMAT
+        )
+        renderer = get_renderer(file_format)
+        if renderer is None:
+            return Response(
+                {'errors': f'Неизвестный формат файла: {file_format}'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            for item in ingredients
-        ]
-        filename = FILE_NAME
-        response = HttpResponse(ingredient_txt, content_type=CONTENT_TYPE)
+        ingredients = ShoppingCartItem.objects.filter(
+            user=request.user
+        ).values(
+            'total_amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')
+        ).order_by('name'
+        ).iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            renderer.render(ingredients),
+            content_type=renderer.content_type
+        )
+        filename = f'{SHOPPING_CART_FILE_NAME}.{renderer.extension}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """ Возвращает тег или список тегов. """
+    cache_scopes = ('tag',)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedResponseMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """ Возвращает ингредиент или список ингредиентов. """
+    cache_scopes = ('ingredient',)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (CustomSearchFilter, DjangoFilterBackend)
     search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """
+        С параметром name работает как автодополнение: отдаёт не больше
+        INGREDIENT_AUTOCOMPLETE_LIMIT ингредиентов, чьё название
+        начинается с name, из кэша в памяти или по индексу в БД.
+        """
+        name = request.query_params.get(CustomSearchFilter.search_param)
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(self.autocomplete, request, name)
+
+    def autocomplete(self, request, name):
+        if INGREDIENT_AUTOCOMPLETE_CACHE:
+            ingredients = ingredient_catalog.search(
+                name, INGREDIENT_AUTOCOMPLETE_LIMIT
+            )
+        else:
+            ingredients = self.get_queryset().filter(
+                name__istartswith=name
+            )[:INGREDIENT_AUTOCOMPLETE_LIMIT]
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     """ Возвращает список избранных рецептов. """
@@ -140,3 +285,21 @@ class ShoppingListViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         return user.shoppinglist.all()
+
+
+class CacheStatsView(APIView):
+    """ Счётчики попаданий и промахов кэша ответов. """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_stats())
+
+
+class MetricsView(APIView):
+    """ Метрики профилирования запросов в формате Prometheus. """
+    permission_classes = (IsInternalOrAdmin,)
+
+    def get(self, request):
+        return HttpResponse(
+            render_metrics(), content_type='text/plain; version=0.0.4'
+        )
@@ -0,0 +1,109 @@
+import csv
+import random
+from collections import defaultdict
+from io import StringIO
+
+from django.db.models import Sum
+
+from benchmarks.dataset import CART_SIZES
+from benchmarks.scenarios import Call
+from recipes.cookable import cookable_index
+from recipes.models import IngredientRecipe
+
+# Проверки корректности на наборе для замеров: ответ оптимизированного
+# пути сравнивается с прямым подсчётом. Функция (runner, results) ->
+# словарь с ключом ok. Только в режиме тестового клиента.
+CHECKS = {}
+
+
+def check(name):
+    def register(func):
+        CHECKS[name] = func
+        return func
+    return register
+
+
+def read_csv(response):
+    content = b''.join(response.streaming_content).decode('utf-8-sig')
+    rows = csv.reader(StringIO(content))
+    next(rows)
+    return {name: int(amount) for name, amount, unit in rows}
+
+
+@check('shopping_cart')
+def shopping_cart(runner, results):
+    """
+    Суммы в выгрузке списка покупок совпадают с суммой по ингредиентам
+    рецептов из корзины. По результатам download_shopping_cart_N
+    считается время на строку выгрузки (ингредиент); growth - его
+    отношение для самой большой корзины к корзине из 10 рецептов:
+    при линейном росте не больше 1 (у корзины из 1 рецепта время
+    почти целиком постоянное).
+    """
+    carts = {}
+    for size in CART_SIZES:
+        user = runner.context.cart_users[size]
+        expected = dict(IngredientRecipe.objects.filter(
+            recipe__shoppinglist__user=user
+        ).values_list('ingredient__name').annotate(
+            total=Sum('amount')
+        ).order_by())
+        response = runner.call(Call(
+            'get', '/api/recipes/download_shopping_cart/?file_format=csv',
+            None, user
+        ))
+        actual = read_csv(response)
+        carts[size] = {
+            'ingredients': len(expected),
+            'mismatches': sum(
+                actual.get(name) != total
+                for name, total in expected.items()
+            ) + len(actual.keys() - expected.keys()),
+        }
+        result = results.get(f'download_shopping_cart_{size}')
+        if result and result['p50_ms'] is not None:
+            carts[size]['ms_per_ingredient'] = round(
+                result['p50_ms'] / max(len(expected), 1), 3)
+    per_line = [
+        cart['ms_per_ingredient'] for size, cart in carts.items()
+        if size >= 10 and 'ms_per_ingredient' in cart
+    ]
+    return {
+        'ok': not any(cart['mismatches'] for cart in carts.values()),
+        'carts': carts,
+        'growth': (
+            round(per_line[-1] / per_line[0], 2)
+            if len(per_line) > 1 and per_line[0] else None
+        ),
+    }
+
+
+@check('cookable')
+def cookable(runner, results, queries=50, max_missing=2):
+    """
+    Ответ индекса «что приготовить» совпадает с перебором составов
+    всех рецептов.
+    """
+    compositions = defaultdict(set)
+    for recipe_id, ingredient_id in IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id'):
+        compositions[recipe_id].add(ingredient_id)
+    rng = random.Random(runner.context.rng.random())
+    recipe_ids = sorted(compositions)
+    mismatches = 0
+    for _ in range(queries):
+        # Часть состава случайного рецепта и случайные ингредиенты,
+        # чтобы в ответе были и полные, и частичные совпадения.
+        sample = sorted(compositions[rng.choice(recipe_ids)])
+        query = set(rng.sample(sample, min(3, len(sample))))
+        query.update(rng.sample(runner.context.ingredient_ids, 5))
+        expected = sorted(
+            (recipe_id, len(ingredients & query), len(ingredients - query))
+            for recipe_id, ingredients in compositions.items()
+            if ingredients & query
+            and len(ingredients - query) <= max_missing
+        )
+        if sorted(cookable_index.match(query, max_missing)) != expected:
+            mismatches += 1
+    return {'ok': not mismatches, 'queries': queries,
+            'mismatches': mismatches}
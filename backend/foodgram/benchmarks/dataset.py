@@ -0,0 +1,126 @@
+import random
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+
+from benchmarks.generator import (DERIVED_COMMANDS, STAGES, Plan,
+                                  reset_sequences, run_chunk)
+from recipes.models import Ingredient, Recipe, ShoppingList, Tag
+from users.models import User
+
+# Все объекты набора помечены префиксом, чтобы их можно было удалить,
+# не трогая остальные данные.
+PREFIX = 'bench'
+
+# Размер набора при scale=1.
+BASE_SIZES = {
+    'users': 200,
+    'recipes': 2000,
+    'ingredients': 1000,
+    'tags': 12,
+}
+
+# Пользователи с корзинами заданного размера для замера выгрузки.
+CART_SIZES = (1, 10, 100, 500)
+
+BATCH_SIZE = 2000
+
+
+def cart_username(size):
+    return f'{PREFIX}_cart_{size}'
+
+
+def sizes_for(scale):
+    return {
+        name: max(int(size * scale), 1) for name, size in BASE_SIZES.items()
+    }
+
+
+def reset_dataset():
+    """ Удаляет набор для замеров вместе со связанными объектами. """
+    with transaction.atomic():
+        User.objects.filter(username__startswith=f'{PREFIX}_').delete()
+        Tag.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        Ingredient.objects.filter(name__startswith=f'{PREFIX} ').delete()
+
+
+def seed_dataset(scale=1.0, seed=0):
+    """
+    Создаёт набор генератором seed_data и добавляет пользователей с
+    корзинами из CART_SIZES рецептов. Вставка идёт без сигналов,
+    поэтому счётчики, ленты и суммы корзин затем пересчитываются.
+    """
+    plan = Plan(PREFIX, seed, **sizes_for(scale))
+    method = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+    totals = {}
+    for stage in STAGES:
+        totals[stage] = sum(
+            run_chunk((plan, *chunk, method, BATCH_SIZE))
+            for chunk in plan.chunks(stage, BATCH_SIZE)
+        )
+    if connection.vendor == 'postgresql':
+        reset_sequences()
+
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(username=cart_username(size),
+             email=f'{cart_username(size)}@example.com',
+             first_name=cart_username(size), last_name=PREFIX,
+             password=password)
+        for size in CART_SIZES
+    ])
+    cart_users = dict(User.objects.filter(
+        username__in=[cart_username(size) for size in CART_SIZES]
+    ).values_list('username', 'id'))
+    rng = random.Random(f'{seed}:carts')
+    recipe_ids = list(plan.ids(Recipe))
+    ShoppingList.objects.bulk_create([
+        ShoppingList(user_id=cart_users[cart_username(size)],
+                     recipe_id=recipe_id)
+        for size in CART_SIZES
+        for recipe_id in rng.sample(recipe_ids, min(size, len(recipe_ids)))
+    ], batch_size=BATCH_SIZE)
+
+    output = StringIO()
+    for name in DERIVED_COMMANDS:
+        call_command(name, stdout=output)
+    return totals
+
+
+class Context:
+    """ Данные набора, по которым строятся запросы сценариев. """
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        users = User.objects.filter(
+            username__startswith=f'{PREFIX}_'
+        ).annotate(follows=Count('follower')).order_by('id')
+        self.users = [user for user in users
+                      if not user.username.startswith(cart_username(''))]
+        if not self.users:
+            raise LookupError('Набор для замеров не создан.')
+        self.cart_users = {
+            size: user for size in CART_SIZES for user in users
+            if user.username == cart_username(size)
+        }
+        # Подписки смотрятся у самого активного пользователя.
+        self.user = max(self.users, key=lambda user: user.follows)
+        self.recipe_ids = list(Recipe.objects.filter(
+            author__in=self.users).values_list('id', flat=True))
+        self.tags = list(Tag.objects.filter(
+            slug__startswith=f'{PREFIX}-').values_list('slug', flat=True))
+        self.tag_ids = list(Tag.objects.filter(
+            slug__in=self.tags).values_list('id', flat=True))
+        self.ingredient_ids = list(Ingredient.objects.filter(
+            name__startswith=f'{PREFIX} ').values_list('id', flat=True))
+        self.tokens = {}
+
+    def token(self, user):
+        if user.id not in self.tokens:
+            self.tokens[user.id] = Token.objects.get_or_create(
+                user=user)[0].key
+        return self.tokens[user.id]
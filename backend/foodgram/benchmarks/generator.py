@@ -0,0 +1,396 @@
+import bisect
+import math
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingList, Tag, TagRecipe)
+from users.models import Follow, User
+
+# Показатель степени закона Ципфа: k-й по популярности объект
+# выбирается в k ** ZIPF_EXPONENT раз реже первого.
+ZIPF_EXPONENT = 1.1
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+# Этапы в порядке вставки: строки следующих этапов ссылаются на строки
+# предыдущих. Строки этапа stage создаёт метод Plan.rows_<stage>.
+STAGES = (
+    'users', 'tags', 'ingredients', 'recipes', 'recipe_links', 'follows',
+    'favorites', 'shopping_lists',
+)
+
+# Команды, восстанавливающие данные, которые обычно поддерживают
+# сигналы: bulk_create и COPY их не вызывают.
+DERIVED_COMMANDS = (
+    'reconcile_counters', 'rebuild_shopping_cart', 'rebuild_feed',
+    'compute_trending',
+)
+
+
+class ZipfSampler:
+    """
+    Выбор id с вероятностью по закону Ципфа.
+
+    Ранг популярности переводится в позицию в ids перестановкой
+    (rank * stride + offset) mod n, поэтому популярные объекты
+    разбросаны по всему диапазону, а не собраны в его начале.
+    Накопленные веса хранятся в array('d'): 8 байт на объект.
+    """
+
+    def __init__(self, ids, exponent=ZIPF_EXPONENT, salt=0):
+        self.ids = ids
+        self.size = len(ids)
+        self.cum_weights = array('d', accumulate(
+            rank ** -exponent for rank in range(1, self.size + 1)
+        ))
+        rng = random.Random(f'zipf:{salt}:{self.size}')
+        self.offset = rng.randrange(self.size) if self.size else 0
+        self.stride = rng.randrange(1, self.size) if self.size > 1 else 1
+        while self.size > 1 and math.gcd(self.stride, self.size) != 1:
+            self.stride += 1
+
+    def choice(self, rng):
+        rank = bisect.bisect(
+            self.cum_weights, rng.random() * self.cum_weights[-1]
+        )
+        rank = min(rank, self.size - 1)
+        return self.ids[(rank * self.stride + self.offset) % self.size]
+
+    def sample(self, rng, count, exclude=None):
+        """ До count разных id; редкие повторы просто отбрасываются. """
+        count = min(count, self.size - (exclude is not None))
+        chosen = {}
+        for _ in range(count * 4):
+            if len(chosen) >= count:
+                break
+            item = self.choice(rng)
+            if item != exclude:
+                chosen[item] = None
+        return list(chosen)
+
+
+def skewed_count(rng, mean, limit):
+    """ Неотрицательное число с длинным хвостом и средним около mean. """
+    if mean <= 0:
+        return 0
+    return min(int(rng.expovariate(1 / mean)), limit)
+
+
+class Plan:
+    """
+    Размеры и диапазоны id создаваемых данных. id назначаются заранее
+    от текущего максимума в таблице, поэтому пачки можно создавать
+    независимо и в любом порядке, а данные зависят только от seed.
+    """
+
+    def __init__(self, prefix, seed, users, recipes, ingredients, tags,
+                 follows=20, favorites=30, shopping_lists=5,
+                 recipe_ingredients=(3, 12), recipe_tags=(1, 3),
+                 history_days=30):
+        self.prefix = prefix
+        self.seed = seed
+        self.sizes = {
+            'users': users,
+            'tags': tags,
+            'ingredients': ingredients,
+            'recipes': recipes,
+            'recipe_links': recipes,
+            'follows': users,
+            'favorites': users,
+            'shopping_lists': users,
+        }
+        self.means = {
+            'follows': follows,
+            'favorites': favorites,
+            'shopping_lists': shopping_lists,
+        }
+        self.recipe_ingredients = recipe_ingredients
+        self.recipe_tags = recipe_tags
+        self.history_days = history_days
+        self.now = timezone.now()
+        self.starts = {
+            model._meta.label: (
+                model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for model in (User, Tag, Ingredient, Recipe)
+        }
+        self.ingredient_ids = None
+        if not ingredients:
+            # Без новых ингредиентов рецепты собираются из уже
+            # загруженных, например командой load_data.
+            self.ingredient_ids = array('l', Ingredient.objects.values_list(
+                'id', flat=True).order_by('id'))
+        self._samplers = {}
+
+    def ids(self, model):
+        start = self.starts[model._meta.label]
+        size = {
+            User: 'users', Tag: 'tags', Ingredient: 'ingredients',
+            Recipe: 'recipes',
+        }[model]
+        return range(start, start + self.sizes[size])
+
+    def sampler(self, name):
+        """ Сэмплеры строятся лениво, в каждом процессе свои. """
+        if name not in self._samplers:
+            if name == 'ingredients' and self.ingredient_ids is not None:
+                ids = self.ingredient_ids
+            else:
+                ids = self.ids({
+                    'users': User, 'tags': Tag, 'ingredients': Ingredient,
+                    'recipes': Recipe,
+                }[name])
+            self._samplers[name] = ZipfSampler(
+                ids, salt=f'{self.seed}:{name}')
+        return self._samplers[name]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_samplers'] = {}
+        return state
+
+    def chunks(self, stage, chunk_size):
+        return [
+            (stage, start, min(start + chunk_size, self.sizes[stage]))
+            for start in range(0, self.sizes[stage], chunk_size)
+        ]
+
+    def rng(self, stage, start):
+        return random.Random(f'{self.seed}:{stage}:{start}')
+
+    def moment(self, rng):
+        """ Случайный момент за последние history_days дней. """
+        return self.now - timedelta(
+            seconds=rng.random() * self.history_days * 86400
+        )
+
+    def rows(self, stage, start, stop):
+        """ Модель, столбцы и строки для номеров start..stop этапа. """
+        rng = self.rng(stage, start)
+        return getattr(self, f'rows_{stage}')(rng, start, stop)
+
+    def rows_users(self, rng, start, stop):
+        password = make_password(None)
+        columns = ('id', 'username', 'email', 'first_name', 'last_name',
+                   'password', 'date_joined')
+        first = self.starts[User._meta.label]
+        rows = [
+            (first + index, f'{self.prefix}_{first + index}',
+             f'{self.prefix}_{first + index}@example.com',
+             f'Имя {first + index}', self.prefix, password,
+             self.moment(rng))
+            for index in range(start, stop)
+        ]
+        return ((User, columns, rows),)
+
+    def rows_tags(self, rng, start, stop):
+        first = self.starts[Tag._meta.label]
+        rows = [
+            (first + index, f'{self.prefix} {first + index}',
+             f'{self.prefix}-{first + index}',
+             f'#{rng.randrange(0x1000000):06x}', self.now)
+            for index in range(start, stop)
+        ]
+        return ((Tag, ('id', 'name', 'slug', 'color', 'updated_at'), rows),)
+
+    def rows_ingredients(self, rng, start, stop):
+        first = self.starts[Ingredient._meta.label]
+        rows = [
+            (first + index, f'{self.prefix} ингредиент {first + index}',
+             rng.choice(UNITS), self.now)
+            for index in range(start, stop)
+        ]
+        return ((Ingredient,
+                 ('id', 'name', 'measurement_unit', 'updated_at'), rows),)
+
+    def rows_recipes(self, rng, start, stop):
+        first = self.starts[Recipe._meta.label]
+        authors = self.sampler('users')
+        columns = ('id', 'author_id', 'name', 'image', 'text',
+                   'cooking_time', 'updated_at')
+        rows = [
+            (first + index, authors.choice(rng),
+             f'{self.prefix} рецепт {first + index}', 'recipes/bench.png',
+             f'Описание рецепта {first + index}.',
+             min(int(rng.lognormvariate(3.4, 0.7)) + 1, 600),
+             self.moment(rng))
+            for index in range(start, stop)
+        ]
+        return ((Recipe, columns, rows),)
+
+    def rows_recipe_links(self, rng, start, stop):
+        first = self.starts[Recipe._meta.label]
+        ingredients = self.sampler('ingredients')
+        tags = self.sampler('tags')
+        links = []
+        tag_links = []
+        for index in range(start, stop):
+            recipe_id = first + index
+            for ingredient_id in ingredients.sample(
+                    rng, rng.randint(*self.recipe_ingredients)):
+                links.append((recipe_id, ingredient_id,
+                              rng.choice((1, 2, 5, 10, 50, 100, 200, 500))))
+            for tag_id in tags.sample(rng, rng.randint(*self.recipe_tags)):
+                tag_links.append((recipe_id, tag_id))
+        return (
+            (IngredientRecipe, ('recipe_id', 'ingredient_id', 'amount'),
+             links),
+            (TagRecipe, ('recipe_id', 'tag_id'), tag_links),
+        )
+
+    def rows_follows(self, rng, start, stop):
+        first = self.starts[User._meta.label]
+        authors = self.sampler('users')
+        rows = []
+        for index in range(start, stop):
+            user_id = first + index
+            count = skewed_count(rng, self.means['follows'], 1000)
+            rows.extend(
+                (user_id, author_id)
+                for author_id in authors.sample(rng, count, exclude=user_id)
+            )
+        return ((Follow, ('user_id', 'following_id'), rows),)
+
+    def rows_user_recipes(self, model, stage, rng, start, stop):
+        first = self.starts[User._meta.label]
+        recipes = self.sampler('recipes')
+        rows = []
+        for index in range(start, stop):
+            count = skewed_count(rng, self.means[stage], 5000)
+            rows.extend(
+                (first + index, recipe_id, self.moment(rng))
+                for recipe_id in recipes.sample(rng, count)
+            )
+        return ((model, ('user_id', 'recipe_id', 'created'), rows),)
+
+    def rows_favorites(self, rng, start, stop):
+        return self.rows_user_recipes(
+            Favorite, 'favorites', rng, start, stop)
+
+    def rows_shopping_lists(self, rng, start, stop):
+        return self.rows_user_recipes(
+            ShoppingList, 'shopping_lists', rng, start, stop)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Отключает auto_now/auto_now_add, чтобы bulk_create записал
+    сгенерированные даты, а не текущее время.
+    """
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(
+                    field, 'auto_now_add', False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+def full_columns(model, columns):
+    """
+    Все столбцы таблицы для COPY: значения не заданных полей берутся
+    из default модели, так как в БД Django значений по умолчанию
+    не создаёт.
+    """
+    extra = []
+    for field in model._meta.concrete_fields:
+        if field.attname in columns or field.primary_key:
+            continue
+        if field.has_default():
+            value = field.get_default()
+        elif field.null:
+            value = None
+        elif getattr(field, 'auto_now', False) or getattr(
+                field, 'auto_now_add', False):
+            value = timezone.now()
+        else:
+            value = field.get_default()
+        extra.append((field, value))
+    return extra
+
+
+def insert_copy(model, columns, rows):
+    extra = full_columns(model, columns)
+    names = [
+        connection.ops.quote_name(model._meta.get_field(column).column)
+        for column in columns
+    ] + [connection.ops.quote_name(field.column) for field, _ in extra]
+    suffix = [copy_value(value) for _, value in extra]
+    buffer = StringIO()
+    for row in rows:
+        buffer.write('\t'.join([copy_value(value) for value in row] + suffix))
+        buffer.write('\n')
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+            f'({", ".join(names)}) FROM STDIN',
+            buffer
+        )
+
+
+def insert_bulk(model, columns, rows, batch_size):
+    with explicit_timestamps(model):
+        model.objects.bulk_create(
+            (model(**dict(zip(columns, row))) for row in rows),
+            batch_size=batch_size
+        )
+
+
+def run_chunk(task):
+    """
+    Создаёт и вставляет строки одной пачки; возвращает их число.
+    task - (plan, stage, start, stop, method, batch_size), одним
+    аргументом для ProcessPoolExecutor.map.
+    """
+    plan, stage, start, stop, method, batch_size = task
+    total = 0
+    with transaction.atomic():
+        for model, columns, rows in plan.rows(stage, start, stop):
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                if method == 'copy':
+                    insert_copy(model, columns, batch)
+                else:
+                    insert_bulk(model, columns, batch, batch_size)
+            total += len(rows)
+    return total
+
+
+def reset_sequences():
+    """ После вставки с явными id счётчики id в PostgreSQL отстают. """
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), (User, Tag, Ingredient, Recipe, IngredientRecipe,
+                     TagRecipe, Follow, Favorite, ShoppingList)
+    )
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
@@ -0,0 +1,217 @@
+import json
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmarks.checks import CHECKS
+from benchmarks.dataset import Context, reset_dataset, seed_dataset
+from benchmarks.runner import ClientRunner, HTTPRunner
+from benchmarks.scenarios import ENDPOINTS, OPERATIONS
+from recipes.images import wait_for_variants
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД синтетическим набором и замеряет основные '
+            'запросы API: p50/p95/p99 времени ответа и число запросов '
+            'к БД в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Множитель размера набора (1 - 200 пользователей, '
+                 '2000 рецептов).'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--reseed',
+            action='store_true',
+            help='Удалить прежний набор и создать заново.'
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            dest='scenarios',
+            help='Сценарий для замера; можно указать несколько раз. '
+                 'По умолчанию - все.'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Число замеров на сценарий.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Число запросов для прогрева перед замерами.'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например '
+                 'http://127.0.0.1:8000; без него запросы идут через '
+                 'тестовый клиент.'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Число одновременных запросов при --url.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов; по умолчанию - стандартный вывод.'
+        )
+        parser.add_argument(
+            '--no-verify',
+            action='store_false',
+            dest='verify',
+            help='Не сверять ответы с прямым подсчётом после замеров.'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Показать сценарии и выйти.'
+        )
+        parser.add_argument(
+            '--clean',
+            action='store_true',
+            help='Удалить набор для замеров и выйти.'
+        )
+
+    def measure(self, runner, names, options):
+        results = {}
+        for name in names:
+            self.stderr.write(f'{name}...')
+            if name in ENDPOINTS:
+                results[name] = runner.run_endpoint(
+                    ENDPOINTS[name], options['iterations'], options['warmup']
+                )
+            else:
+                results[name] = runner.run_operation(
+                    OPERATIONS[name], options['iterations'], options['warmup']
+                )
+        return results
+
+    def verify(self, runner, results):
+        checks = {}
+        for name, check in CHECKS.items():
+            self.stderr.write(f'Проверка {name}...')
+            checks[name] = check(runner, results)
+            if not checks[name]['ok']:
+                self.stderr.write(self.style.ERROR(
+                    f'Проверка {name} не пройдена.'))
+        return checks
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in ENDPOINTS:
+                self.stdout.write(name)
+            for name in OPERATIONS:
+                self.stdout.write(f'{name} (только без --url)')
+            return
+        if options['clean']:
+            reset_dataset()
+            self.stderr.write('Набор для замеров удалён.')
+            return
+
+        names = options['scenarios'] or list(ENDPOINTS) + list(OPERATIONS)
+        unknown = set(names) - set(ENDPOINTS) - set(OPERATIONS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}.'
+            )
+        if options['url']:
+            skipped = [name for name in names if name in OPERATIONS]
+            if skipped:
+                self.stderr.write(
+                    f'Без тестового клиента не выполняются: '
+                    f'{", ".join(skipped)}.'
+                )
+            names = [name for name in names if name in ENDPOINTS]
+
+        started = datetime.now(timezone.utc)
+        dataset = None
+        if options['reseed']:
+            reset_dataset()
+        try:
+            context = Context(seed=options['seed'])
+        except LookupError:
+            self.stderr.write('Создание набора для замеров...')
+            dataset = seed_dataset(options['scale'], options['seed'])
+            context = Context(seed=options['seed'])
+
+        checks = None
+        if options['url']:
+            runner = HTTPRunner(
+                context, options['url'], concurrency=options['concurrency']
+            )
+            results = self.measure(runner, names, options)
+        else:
+            # Картинки рецептов, созданных при замерах, пишутся во
+            # временный каталог и удаляются вместе с ним.
+            with tempfile.TemporaryDirectory(
+                    prefix='foodgram-benchmark-') as media_root:
+                with override_settings(MEDIA_ROOT=media_root):
+                    runner = ClientRunner(context)
+                    try:
+                        results = self.measure(runner, names, options)
+                        if options['verify']:
+                            checks = self.verify(runner, results)
+                    finally:
+                        wait_for_variants()
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'started': started.isoformat(),
+                'mode': 'http' if options['url'] else 'client',
+                'url': options['url'],
+                'concurrency': (
+                    options['concurrency'] if options['url'] else 1
+                ),
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'dataset': dataset,
+                'database': connection.vendor,
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'server_side_cursors': not connection.settings_dict[
+                    'DISABLE_SERVER_SIDE_CURSORS'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+            'checks': checks,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stderr.write(f'Результаты записаны в {options["output"]}.')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,145 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from benchmarks.generator import (DERIVED_COMMANDS, STAGES, Plan,
+                                  reset_sequences, run_chunk)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД синтетическими пользователями, рецептами, '
+            'подписками, избранным и корзинами с распределением '
+            'популярности по закону Ципфа. При одинаковых параметрах '
+            'и --seed данные одинаковы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Число пользователей.')
+        parser.add_argument('--recipes', type=int, default=5000,
+                            help='Число рецептов.')
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=2000,
+            help='Число новых ингредиентов; 0 - брать уже загруженные.'
+        )
+        parser.add_argument('--tags', type=int, default=20,
+                            help='Число тегов.')
+        parser.add_argument('--follows', type=float, default=20,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--favorites', type=float, default=30,
+                            help='Среднее число рецептов в избранном.')
+        parser.add_argument('--shopping-lists', type=float, default=5,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора случайных чисел.')
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Префикс имён создаваемых объектов.'
+        )
+        parser.add_argument(
+            '--method',
+            choices=('auto', 'bulk', 'copy'),
+            default='auto',
+            help='Способ вставки: bulk_create или COPY (только '
+                 'PostgreSQL); auto - COPY, если он доступен.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одной вставке.')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=20000,
+            help='Объектов в одной пачке (задаче процесса). Данные '
+                 'зависят от этого значения.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Число процессов для вставки (только PostgreSQL).'
+        )
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help='Не пересчитывать счётчики, корзины, ленты и тренды.'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['recipes'], options['tags']) < 1:
+            raise CommandError('Нужны хотя бы один пользователь, '
+                               'рецепт и тег.')
+        postgres = connection.vendor == 'postgresql'
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if postgres else 'bulk'
+        if method == 'copy' and not postgres:
+            raise CommandError('COPY доступен только в PostgreSQL.')
+        workers = options['workers']
+        if workers > 1 and not postgres:
+            self.stderr.write('SQLite не допускает параллельной записи, '
+                              'вставка идёт в одном процессе.')
+            workers = 1
+
+        plan = Plan(
+            options['prefix'], options['seed'],
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients=options['ingredients'],
+            tags=options['tags'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            shopping_lists=options['shopping_lists'],
+        )
+        if plan.ingredient_ids is not None and not plan.ingredient_ids:
+            raise CommandError('В БД нет ингредиентов: загрузите их '
+                               'командой load_data или задайте '
+                               '--ingredients.')
+
+        executor = None
+        if workers > 1:
+            # Дочерние процессы открывают свои соединения.
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=get_context('fork')
+            )
+        try:
+            for stage in STAGES:
+                started = time.monotonic()
+                tasks = [
+                    (plan, *chunk, method, options['batch_size'])
+                    for chunk in plan.chunks(stage, options['chunk_size'])
+                ]
+                if executor:
+                    total = sum(executor.map(run_chunk, tasks))
+                else:
+                    total = sum(map(run_chunk, tasks))
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{stage}: {total} строк за {elapsed:.1f} с '
+                    f'({total / max(elapsed, 1e-6):.0f} строк/с).'
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if postgres:
+            reset_sequences()
+        if options['skip_derived']:
+            self.stdout.write(
+                'Пересчёт пропущен; выполните позже: '
+                f'{", ".join(DERIVED_COMMANDS)}.'
+            )
+            return
+        for name in DERIVED_COMMANDS:
+            started = time.monotonic()
+            call_command(name, stdout=self.stdout)
+            self.stdout.write(
+                f'{name}: {time.monotonic() - started:.1f} с.'
+            )
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
@@ -0,0 +1,190 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+# Число запросов к БД из заголовка Server-Timing (PROFILING_SERVER_TIMING).
+SERVER_TIMING_QUERIES = re.compile(r'db;desc="(\d+) queries"')
+
+
+def percentile(values, fraction):
+    """ Процентиль с линейной интерполяцией по отсортированным values. """
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+def summarize(samples, queries, errors, elapsed=None):
+    """ Сводка по замерам в миллисекундах. """
+    samples = sorted(sample * 1000 for sample in samples)
+    result = {
+        'iterations': len(samples),
+        'errors': errors,
+        'p50_ms': percentile(samples, 0.5),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+        'mean_ms': sum(samples) / len(samples) if samples else None,
+        'min_ms': samples[0] if samples else None,
+        'max_ms': samples[-1] if samples else None,
+        'queries_mean': sum(queries) / len(queries) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+    for key, value in result.items():
+        if isinstance(value, float):
+            result[key] = round(value, 3)
+    if elapsed:
+        result['requests_per_second'] = round(len(samples) / elapsed, 1)
+    return result
+
+
+def drain(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+class ClientRunner:
+    """ Запросы через тестовый клиент в том же процессе. """
+
+    def __init__(self, context):
+        self.context = context
+        self.clients = {}
+
+    def get_client(self, user):
+        key = user.id if user else None
+        if key not in self.clients:
+            client = APIClient()
+            if user:
+                client.credentials(
+                    HTTP_AUTHORIZATION=f'Token {self.context.token(user)}'
+                )
+            self.clients[key] = client
+        return self.clients[key]
+
+    def call(self, request):
+        client = self.get_client(request.user)
+        if request.data is None:
+            return getattr(client, request.method)(request.path)
+        return getattr(client, request.method)(
+            request.path, request.data, format='json'
+        )
+
+    def run_endpoint(self, scenario, iterations, warmup):
+        for index in range(warmup):
+            drain(self.call(scenario(self.context, index)))
+        samples = []
+        queries = []
+        errors = 0
+        for index in range(warmup, warmup + iterations):
+            request = scenario(self.context, index)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self.call(request)
+                drain(response)
+                samples.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            if response.status_code >= 400:
+                errors += 1
+        return summarize(samples, queries, errors)
+
+    def run_operation(self, factory, iterations, warmup):
+        func = factory(self.context)
+        for _ in range(warmup):
+            func()
+        samples = []
+        queries = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - started)
+            queries.append(len(captured))
+        return summarize(samples, queries, 0)
+
+
+class HTTPRunner:
+    """
+    Нагрузка на запущенный сервер (например, gunicorn) из concurrency
+    потоков. Число запросов к БД берётся из заголовка Server-Timing,
+    если на сервере включено PROFILING_SERVER_TIMING.
+    """
+
+    def __init__(self, context, base_url, concurrency=8, timeout=60):
+        self.context = context
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.lock = threading.Lock()
+
+    def call(self, request):
+        headers = {'Accept': 'application/json'}
+        body = None
+        if request.user:
+            headers['Authorization'] = (
+                f'Token {self.context.token(request.user)}'
+            )
+        if request.data is not None:
+            body = json.dumps(request.data).encode()
+            headers['Content-Type'] = 'application/json'
+        http_request = Request(
+            self.base_url + request.path, data=body, headers=headers,
+            method=request.method.upper()
+        )
+        try:
+            with urlopen(http_request, timeout=self.timeout) as response:
+                response.read()
+                status, timing = response.status, response.headers.get(
+                    'Server-Timing', '')
+        except HTTPError as error:
+            error.read()
+            status, timing = error.code, error.headers.get(
+                'Server-Timing', '')
+        match = SERVER_TIMING_QUERIES.search(timing)
+        return status, int(match.group(1)) if match else None
+
+    def run_endpoint(self, scenario, iterations, warmup):
+        # Запросы строятся заранее: random.Random не потокобезопасен.
+        requests = [
+            scenario(self.context, index)
+            for index in range(warmup + iterations)
+        ]
+        for request in requests:
+            if request.user:
+                self.context.token(request.user)
+        for request in requests[:warmup]:
+            self.call(request)
+        samples = []
+        queries = []
+        errors = 0
+
+        def worker(request):
+            nonlocal errors
+            started = time.perf_counter()
+            try:
+                status, count = self.call(request)
+            except OSError:
+                status, count = None, None
+            duration = time.perf_counter() - started
+            with self.lock:
+                samples.append(duration)
+                if count is not None:
+                    queries.append(count)
+                if status is None or status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(worker, requests[warmup:]))
+        elapsed = time.perf_counter() - started
+        return summarize(samples, queries, errors, elapsed)
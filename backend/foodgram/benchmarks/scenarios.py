@@ -0,0 +1,222 @@
+import base64
+from collections import namedtuple
+from io import BytesIO
+from urllib.parse import quote
+
+from django.db import connection
+from PIL import Image
+
+from benchmarks.dataset import CART_SIZES, PREFIX
+from foodgram.db import check_connections, mark_connections_idle
+from recipes.cookable import cookable_index
+
+# Один HTTP-запрос сценария; user=None - анонимный запрос.
+Call = namedtuple('Call', ('method', 'path', 'data', 'user'))
+
+# Сценарии-запросы к API: функция (context, номер итерации) -> Call.
+# Выполняются и тестовым клиентом, и по HTTP.
+ENDPOINTS = {}
+
+# Замеры внутри процесса: функция (context) -> функция без аргументов,
+# время вызова которой измеряется. Только в режиме тестового клиента.
+OPERATIONS = {}
+
+
+def endpoint(name):
+    def register(func):
+        ENDPOINTS[name] = func
+        return func
+    return register
+
+
+def operation(name):
+    def register(func):
+        OPERATIONS[name] = func
+        return func
+    return register
+
+
+def png_data_uri(size=(64, 64)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@endpoint('recipes_list')
+def recipes_list(context, index):
+    return Call('get', '/api/recipes/', None, context.user)
+
+
+@endpoint('recipes_list_anonymous')
+def recipes_list_anonymous(context, index):
+    page = index % 5 + 1
+    return Call('get', f'/api/recipes/?page={page}', None, None)
+
+
+@endpoint('recipes_list_filtered')
+def recipes_list_filtered(context, index):
+    tag = context.tags[index % len(context.tags)]
+    return Call(
+        'get', f'/api/recipes/?tags={tag}&is_favorited=1&ordering=popular',
+        None, context.user
+    )
+
+
+def tags_query(tags):
+    return '&'.join(f'tags={tag}' for tag in tags)
+
+
+# Фильтр по тегам (EXISTS по TagRecipe): 1, 3 и все теги сразу.
+@endpoint('recipes_tags_1')
+def recipes_tags_1(context, index):
+    tags = context.tags[index % len(context.tags):][:1]
+    return Call(
+        'get', f'/api/recipes/?{tags_query(tags)}', None, context.user
+    )
+
+
+@endpoint('recipes_tags_3')
+def recipes_tags_3(context, index):
+    tags = [context.tags[(index + step) % len(context.tags)]
+            for step in range(3)]
+    return Call(
+        'get', f'/api/recipes/?{tags_query(tags)}', None, context.user
+    )
+
+
+@endpoint('recipes_tags_all')
+def recipes_tags_all(context, index):
+    return Call(
+        'get', f'/api/recipes/?{tags_query(context.tags)}', None,
+        context.user
+    )
+
+
+@endpoint('recipe_retrieve')
+def recipe_retrieve(context, index):
+    recipe_id = context.rng.choice(context.recipe_ids)
+    return Call('get', f'/api/recipes/{recipe_id}/', None, context.user)
+
+
+@endpoint('subscriptions')
+def subscriptions(context, index):
+    return Call(
+        'get', '/api/users/subscriptions/?recipes_limit=3', None,
+        context.user
+    )
+
+
+@endpoint('download_shopping_cart')
+def download_shopping_cart(context, index):
+    return Call(
+        'get', '/api/recipes/download_shopping_cart/', None, context.user
+    )
+
+
+def cart_endpoint(size):
+    def download(context, index):
+        return Call(
+            'get', '/api/recipes/download_shopping_cart/', None,
+            context.cart_users[size]
+        )
+    return download
+
+
+# Выгрузка списка покупок при разном числе рецептов в корзине.
+for cart_size in CART_SIZES:
+    endpoint(f'download_shopping_cart_{cart_size}')(cart_endpoint(cart_size))
+
+
+@endpoint('ingredient_search')
+def ingredient_search(context, index):
+    prefix = quote(f'{PREFIX} ингредиент {index % 10}')
+    return Call('get', f'/api/ingredients/?name={prefix}', None, None)
+
+
+# Полнотекстовый поиск: слово из каждого рецепта набора (ранжируется
+# вся выборка) и редкое сочетание слов.
+@endpoint('recipes_search_broad')
+def recipes_search_broad(context, index):
+    return Call(
+        'get', f'/api/recipes/?search={quote("рецепт")}', None, context.user
+    )
+
+
+@endpoint('recipes_search_narrow')
+def recipes_search_narrow(context, index):
+    query = quote(f'{PREFIX} ингредиент {index % 100}')
+    return Call('get', f'/api/recipes/?search={query}', None, context.user)
+
+
+def cookable_ingredients(context):
+    return context.rng.sample(context.ingredient_ids, 10)
+
+
+@endpoint('recipes_cookable')
+def recipes_cookable(context, index):
+    ingredients = ','.join(map(str, cookable_ingredients(context)))
+    return Call(
+        'get', f'/api/recipes/cookable/?ingredients={ingredients}&missing=2',
+        None, context.user
+    )
+
+
+@endpoint('recipe_create')
+def recipe_create(context, index):
+    if not hasattr(context, 'image'):
+        context.image = png_data_uri()
+    ingredients = context.rng.sample(context.ingredient_ids, 5)
+    return Call('post', '/api/recipes/', {
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 100}
+            for ingredient_id in ingredients
+        ],
+        'tags': context.rng.sample(context.tag_ids, 2),
+        'image': context.image,
+        'name': f'{PREFIX} новый рецепт {index}',
+        'text': 'Рецепт, созданный при замерах.',
+        'cooking_time': 30,
+    }, context.user)
+
+
+# Подбор по индексу «что приготовить» без HTTP и сериализации.
+@operation('cookable_match')
+def cookable_match(context):
+    def run():
+        cookable_index.match(cookable_ingredients(context), max_missing=2)
+    return run
+
+
+def select_one():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+# Цена соединения с БД на запрос: новое соединение (DB_CONN_MAX_AGE=0)
+# против постоянного. Постоянное проверяется, как между запросами:
+# пинг нужен только после простоя дольше DB_CONN_HEALTH_CHECK_IDLE,
+# db_connection_ping - запрос с пингом.
+@operation('db_connection_new')
+def db_connection_new(context):
+    def run():
+        connection.close()
+        select_one()
+    return run
+
+
+@operation('db_connection_persistent')
+def db_connection_persistent(context):
+    def run():
+        check_connections()
+        select_one()
+        mark_connections_idle()
+    return run
+
+
+@operation('db_connection_ping')
+def db_connection_ping(context):
+    def run():
+        connection.is_usable()
+        select_one()
+    return run
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+
+
+class FoodgramConfig(AppConfig):
+    name = 'foodgram'
+
+    def ready(self):
+        from foodgram.db import check_connections, mark_connections_idle
+        request_started.connect(check_connections)
+        request_finished.connect(mark_connections_idle)
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.db import connections
+
+# Время окончания последнего запроса, обслуженного соединением.
+IDLE_SINCE = 'foodgram_idle_since'
+
+
+def mark_connections_idle(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        setattr(connection, IDLE_SINCE, now)
+
+
+def check_connections(**kwargs):
+    """
+    Проверяет постоянные соединения перед запросом, как
+    CONN_HEALTH_CHECKS в Django 4.1: соединение, разорванное сервером
+    или пулом, закрывается, и запрос откроет новое вместо ошибки.
+    Пингуются только соединения, простоявшие дольше
+    DB_CONN_HEALTH_CHECK_IDLE секунд: под нагрузкой проверка не
+    добавляет запросу лишнего обращения к БД. Устаревшие по
+    CONN_MAX_AGE соединения к этому моменту уже закрыты.
+    """
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        idle = now - getattr(connection, IDLE_SINCE, now)
+        if idle > settings.DB_CONN_HEALTH_CHECK_IDLE and (
+                not connection.is_usable()):
+            connection.close()
@@ -22,9 +22,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'foodgram.apps.FoodgramConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'benchmarks.apps.BenchmarksConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -32,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,6 +69,21 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Постоянные соединения с БД: DB_CONN_MAX_AGE секунд (0 - новое
+# соединение на каждый запрос, none - без ограничения). Открытое
+# соединение, простоявшее дольше DB_CONN_HEALTH_CHECK_IDLE секунд,
+# проверяется перед запросом, если не задано
+# DB_CONN_HEALTH_CHECKS_DISABLED. DB_PGBOUNCER - работа через PgBouncer
+# в режиме пула транзакций: серверные курсоры живут дольше транзакции
+# и с таким пулом не работают, поэтому отключаются.
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', default='60')
+DB_CONN_HEALTH_CHECKS = not os.getenv('DB_CONN_HEALTH_CHECKS_DISABLED')
+DB_CONN_HEALTH_CHECK_IDLE = float(
+    os.getenv('DB_CONN_HEALTH_CHECK_IDLE', default=5)
+)
+DB_PGBOUNCER = bool(os.getenv('DB_PGBOUNCER'))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', default=5))
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
@@ -73,10 +91,36 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default=''),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': (
+            None if DB_CONN_MAX_AGE == 'none' else int(DB_CONN_MAX_AGE)
+        ),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default']['OPTIONS'] = {
+        'connect_timeout': DB_CONNECT_TIMEOUT,
+    }
+
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -140,5 +184,74 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MIN_COOKING_TIME = 1
 MIN_INGREDIENT_AMOUNT = 1
 
-FILE_NAME = 'ShoppingCart.txt'
-CONTENT_TYPE = 'text/plain'
+SHOPPING_CART_FILE_NAME = 'ShoppingCart'
+SHOPPING_CART_DEFAULT_FORMAT = 'txt'
+SHOPPING_CART_RENDERERS = {
+    'txt': 'api.exporters.TextRenderer',
+    'csv': 'api.exporters.CSVRenderer',
+    'pdf': 'api.exporters.PDFRenderer',
+}
+SHOPPING_CART_PDF_FONT = os.getenv('SHOPPING_CART_PDF_FONT')
+SHOPPING_CART_CHUNK_SIZE = 500
+
+INGREDIENT_AUTOCOMPLETE_CACHE = bool(os.getenv('INGREDIENT_AUTOCOMPLETE_CACHE'))
+INGREDIENT_AUTOCOMPLETE_CACHE_TTL = 300
+INGREDIENT_AUTOCOMPLETE_LIMIT = int(
+    os.getenv('INGREDIENT_AUTOCOMPLETE_LIMIT', default=20)
+)
+
+COOKABLE_INDEX_TTL = 60 * 10
+COOKABLE_MAX_MISSING = 5
+
+# Тренды: окно активности, период полураспада её веса и веса событий.
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WEIGHTS = {
+    'favorite': 1.0,
+    'shopping_cart': 2.0,
+}
+TRENDING_SIZE = 500
+
+# Лента подписок: рецепты авторов с большим числом подписчиков
+# читаются при запросе, а не рассылаются по лентам.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BACKFILL_SIZE = 100
+
+# Картинки рецептов: ограничения загрузки и варианты для выдачи.
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_MAX_DIMENSION = 4096
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+RECIPE_THUMBNAIL_SIZE = (400, 400)
+RECIPE_WEBP_SIZE = (1200, 1200)
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+RECIPE_IMAGE_PLACEHOLDER = bool(os.getenv('RECIPE_IMAGE_PLACEHOLDER'))
+RECIPE_PLACEHOLDER_SIZE = (16, 16)
+IMAGE_URL_CACHE_SIZE = 10000
+
+API_CACHE_ENABLED = not os.getenv('API_CACHE_DISABLED')
+# Штампы bump_version() живут в кэше Django. Кэш в памяти процесса у
+# каждого процесса gunicorn свой: остальные процессы не узнают об
+# изменениях и отдают старые ответы и 304. Поэтому без Redis кэш
+# ответов и условные GET включаются только явно для одного процесса
+# (runserver, gunicorn -w 1).
+API_CACHE_SHARED = bool(REDIS_URL or os.getenv('API_CACHE_SINGLE_PROCESS'))
+API_CACHE_TIMEOUT = 60 * 5
+API_STAMP_TIMEOUT = 60 * 60
+
+# Число рецептов в ответе пагинации по ключу: exact - COUNT(*),
+# estimate - оценка планировщика PostgreSQL, none - не считать.
+RECIPE_PAGINATION_COUNT = os.getenv('RECIPE_PAGINATION_COUNT', default='exact')
+
+# Профилирование запросов: метрики Prometheus на /api/metrics/,
+# заголовок Server-Timing и журнал медленных запросов.
+PROFILING_ENABLED = bool(os.getenv('PROFILING'))
+PROFILING_SERVER_TIMING = bool(os.getenv('PROFILING_SERVER_TIMING'))
+PROFILING_SLOW_MS = int(os.getenv('PROFILING_SLOW_MS', default=500))
+PROFILING_SLOW_SAMPLE_RATE = float(
+    os.getenv('PROFILING_SLOW_SAMPLE_RATE', default=0.1)
+)
+PROFILING_FLUSH_INTERVAL = 10
+PROFILING_METRICS_IPS = os.getenv(
+    'PROFILING_METRICS_IPS', default=','.join(INTERNAL_IPS)
+).split(',')
@@ -1,11 +1,38 @@
 from django.contrib import admin
 
 from recipes.models import (Recipe, Ingredient, Tag, Favorite,
-                            TagRecipe, IngredientRecipe, ShoppingList
-                            )
+                            TagRecipe, IngredientRecipe, ShoppingList,
+                            ShoppingCartItem)
+from recipes.images import schedule_variants
 from users.models import User, Follow
 
 
+def composition(rows):
+    """ Снимок состава: {(id рецепта, id ингредиента): количество}. """
+    return {
+        (recipe_id, ingredient_id): amount
+        for recipe_id, ingredient_id, amount in rows.values_list(
+            'recipe_id', 'ingredient_id', 'amount')
+    }
+
+
+class ShoppingCartSyncMixin:
+    """
+    Правки ингредиентов рецептов в инлайнах применяются к спискам
+    покупок так же, как изменения рецепта через API.
+    """
+
+    def get_ingredient_rows(self, obj):
+        raise NotImplementedError
+
+    def save_related(self, request, form, formsets, change):
+        rows = self.get_ingredient_rows(form.instance)
+        before = composition(rows)
+        super().save_related(request, form, formsets, change)
+        ShoppingCartItem.objects.apply_composition_changes(
+            before, composition(rows))
+
+
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'following')
     list_filter = ('user',)
@@ -28,10 +55,18 @@ class IngredientRecipeInline(admin.TabularInline):
     extra = 1
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ShoppingCartSyncMixin, admin.ModelAdmin):
+
+    def get_ingredient_rows(self, obj):
+        return IngredientRecipe.objects.filter(recipe=obj)
 
     def total_in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data and obj.image:
+            schedule_variants(obj.id)
 
     readonly_fields = ('total_in_favorites',)
     list_display = ('name', 'author')
@@ -41,7 +76,11 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientRecipeInline, TagRecipeInline)
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ShoppingCartSyncMixin, admin.ModelAdmin):
+
+    def get_ingredient_rows(self, obj):
+        return IngredientRecipe.objects.filter(ingredient=obj)
+
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
     list_filter = ('measurement_unit',)
@@ -73,6 +112,22 @@ class ShoppingListAdmin(admin.ModelAdmin):
 class IngredientRecipeAdmin(admin.ModelAdmin):
     search_fields = ('recipe__name', 'ingredient__name')
 
+    def save_model(self, request, obj, form, change):
+        before = composition(
+            IngredientRecipe.objects.filter(pk=obj.pk)) if change else {}
+        super().save_model(request, obj, form, change)
+        ShoppingCartItem.objects.apply_composition_changes(
+            before, composition(IngredientRecipe.objects.filter(pk=obj.pk)))
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(
+            request, IngredientRecipe.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        before = composition(queryset)
+        super().delete_queryset(request, queryset)
+        ShoppingCartItem.objects.apply_composition_changes(before, {})
+
 
 class TagRecipeAdmin(admin.ModelAdmin):
     search_fields = ('tag__name', 'recipe__name')
@@ -0,0 +1,64 @@
+import bisect
+import threading
+import time
+
+from foodgram.settings import INGREDIENT_AUTOCOMPLETE_CACHE_TTL
+from recipes.models import Ingredient
+
+
+class IngredientCatalog:
+    """
+    Кэш справочника ингредиентов в памяти процесса для автодополнения.
+    Хранит отсортированный массив названий в нижнем регистре: поиск по
+    префиксу - это двоичный поиск начала диапазона и проход до его конца.
+    Сбрасывается сигналами при изменении Ingredient в этом процессе,
+    а в остальных процессах устаревает не позже чем через TTL.
+    """
+
+    def __init__(self, ttl=INGREDIENT_AUTOCOMPLETE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._keys = None
+        self._ingredients = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+            self._ingredients = None
+
+    def _load(self):
+        rows = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit').order_by()
+        entries = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows.iterator()
+        )
+        keys = [entry[0] for entry in entries]
+        ingredients = [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for _, pk, name, measurement_unit in entries
+        ]
+        return keys, ingredients
+
+    def _get(self):
+        with self._lock:
+            expired = time.monotonic() - self._loaded_at > self.ttl
+            if self._keys is None or expired:
+                self._keys, self._ingredients = self._load()
+                self._loaded_at = time.monotonic()
+            return self._keys, self._ingredients
+
+    def search(self, prefix, limit):
+        keys, ingredients = self._get()
+        prefix = prefix.lower()
+        start = bisect.bisect_left(keys, prefix)
+        result = []
+        for index in range(start, min(start + limit, len(keys))):
+            if not keys[index].startswith(prefix):
+                break
+            result.append(ingredients[index])
+        return result
+
+
+ingredient_catalog = IngredientCatalog()
@@ -0,0 +1,277 @@
+import bisect
+import logging
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.db import connections
+
+from foodgram.settings import COOKABLE_INDEX_TTL
+from recipes.models import IngredientRecipe
+
+logger = logging.getLogger(__name__)
+
+
+def set_bit(bits, number):
+    index = number >> 3
+    if index >= len(bits):
+        bits.extend(bytes(index - len(bits) + 1))
+    bits[index] |= 1 << (number & 7)
+
+
+def clear_bit(bits, number):
+    index = number >> 3
+    if index < len(bits):
+        bits[index] &= ~(1 << (number & 7)) & 0xFF
+
+
+def test_bit(bits, number):
+    index = number >> 3
+    return index < len(bits) and bits[index] >> (number & 7) & 1
+
+
+def iter_bits(mask):
+    """ Номера единичных битов целого числа по возрастанию. """
+    digits = format(mask, 'b')[::-1]
+    index = digits.find('1')
+    while index != -1:
+        yield index
+        index = digits.find('1', index + 1)
+
+
+class CookableIndex:
+    """
+    Инвертированный индекс "ингредиент -> рецепты" в памяти процесса
+    для подбора рецептов по имеющимся продуктам.
+
+    Редкие ингредиенты хранят отсортированный массив id рецептов
+    (array('l')), частые (соль, вода) - битовую карту по id рецепта:
+    она компактнее, когда в массиве больше 1/64 всех рецептов. По
+    массивам совпадения считаются счётчиком, по битовым картам -
+    побитовым сложением целых чисел, так что запрос с частыми
+    ингредиентами не перебирает сотни тысяч рецептов в Python.
+    Число ингредиентов рецепта хранится в array('H') по id и битовыми
+    картами "рецепты из t ингредиентов".
+
+    Изменения рецептов этого процесса применяются точечно
+    (set_recipe/remove_recipe), остальные процессы подхватывают их
+    при перестроении не позже чем через TTL. Устаревший индекс
+    перестраивается в фоновом потоке, а запросы до замены читают
+    прежний; рецепты, изменённые во время перестроения, после замены
+    перечитываются.
+    """
+
+    def __init__(self, ttl=COOKABLE_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sparse = None
+        self._dense = None
+        self._sizes = None
+        self._by_size = None
+        self._loaded_at = 0
+        self._rebuilding = None
+        self._dirty = None
+
+    def invalidate(self):
+        with self._lock:
+            self._sparse = None
+
+    def _load(self):
+        rows = IngredientRecipe.objects.values_list(
+            'ingredient_id', 'recipe_id'
+        ).order_by('ingredient_id', 'recipe_id')
+        return self._build(rows.iterator(chunk_size=10000))
+
+    def _swap(self, state):
+        self._sparse, self._dense, self._sizes, self._by_size = state
+        self._loaded_at = time.monotonic()
+
+    @staticmethod
+    def _build(rows):
+        """
+        Строит индекс по парам (ингредиент, рецепт) в этом порядке.
+        Возвращает (редкие, частые, размеры, рецепты по размеру).
+        """
+        postings = {}
+        sizes = array('H')
+        last = None
+        for ingredient_id, recipe_id in rows:
+            if (ingredient_id, recipe_id) == last:
+                continue
+            last = (ingredient_id, recipe_id)
+            postings.setdefault(ingredient_id, array('l')).append(recipe_id)
+            if recipe_id >= len(sizes):
+                sizes.extend(array('H', bytes(
+                    2 * (recipe_id - len(sizes) + 1))))
+            sizes[recipe_id] += 1
+        sparse = {}
+        dense = {}
+        for ingredient_id, recipes in postings.items():
+            if len(recipes) * 64 >= len(sizes):
+                bits = bytearray()
+                for recipe_id in recipes:
+                    set_bit(bits, recipe_id)
+                dense[ingredient_id] = bits
+            else:
+                sparse[ingredient_id] = recipes
+        by_size = {}
+        for recipe_id, size in enumerate(sizes):
+            if size:
+                set_bit(by_size.setdefault(size, bytearray()), recipe_id)
+        return sparse, dense, sizes, by_size
+
+    def _ensure_loaded(self):
+        if self._sparse is None:
+            self._swap(self._load())
+        elif (time.monotonic() - self._loaded_at > self.ttl
+                and self._rebuilding is None):
+            self._dirty = set()
+            self._rebuilding = threading.Thread(
+                target=self._rebuild, daemon=True)
+            self._rebuilding.start()
+
+    def _rebuild(self):
+        """ Фоновое перестроение: новый индекс заменяет прежний целиком. """
+        try:
+            try:
+                state = self._load()
+            except Exception:
+                logger.exception('Не удалось перестроить индекс рецептов')
+                state = None
+            with self._lock:
+                # После invalidate индекс загрузится заново при запросе.
+                if state is not None and self._sparse is not None:
+                    self._swap(state)
+                else:
+                    self._loaded_at = time.monotonic()
+                dirty, self._dirty = self._dirty, None
+                self._rebuilding = None
+            for recipe_id in dirty:
+                self.refresh_recipe(recipe_id)
+        finally:
+            connections.close_all()
+
+    def _discard(self, recipe_id):
+        if recipe_id is None:
+            return
+        if self._dirty is not None:
+            self._dirty.add(recipe_id)
+        if recipe_id >= len(self._sizes) or not self._sizes[recipe_id]:
+            return
+        for ingredient_id in list(self._sparse):
+            recipes = self._sparse[ingredient_id]
+            index = bisect.bisect_left(recipes, recipe_id)
+            if index < len(recipes) and recipes[index] == recipe_id:
+                del recipes[index]
+                if not recipes:
+                    del self._sparse[ingredient_id]
+        for bits in self._dense.values():
+            clear_bit(bits, recipe_id)
+        clear_bit(self._by_size[self._sizes[recipe_id]], recipe_id)
+        self._sizes[recipe_id] = 0
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """ Заменяет в индексе состав рецепта. """
+        ingredient_ids = set(ingredient_ids)
+        with self._lock:
+            if self._sparse is None:
+                return
+            self._discard(recipe_id)
+            if not ingredient_ids:
+                return
+            for ingredient_id in ingredient_ids:
+                if ingredient_id in self._dense:
+                    set_bit(self._dense[ingredient_id], recipe_id)
+                else:
+                    bisect.insort(
+                        self._sparse.setdefault(ingredient_id, array('l')),
+                        recipe_id
+                    )
+            if recipe_id >= len(self._sizes):
+                self._sizes.extend(array('H', bytes(
+                    2 * (recipe_id - len(self._sizes) + 1))))
+            size = len(ingredient_ids)
+            self._sizes[recipe_id] = size
+            set_bit(self._by_size.setdefault(size, bytearray()), recipe_id)
+
+    def refresh_recipe(self, recipe_id):
+        """ Перечитывает состав рецепта из БД. """
+        if self._sparse is None:
+            return
+        self.set_recipe(recipe_id, list(IngredientRecipe.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', flat=True)))
+
+    def remove_recipe(self, recipe_id):
+        with self._lock:
+            if self._sparse is not None:
+                self._discard(recipe_id)
+
+    def match(self, ingredient_ids, max_missing=0):
+        """
+        Рецепты, для которых не хватает не больше max_missing
+        ингредиентов. Возвращает список (id, совпало, не хватает),
+        отсортированный по числу недостающих, затем по доле
+        совпавших и от новых рецептов к старым.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            result = self._match(set(ingredient_ids), max_missing)
+        result.sort(key=lambda item: (
+            item[2], -item[1] / (item[1] + item[2]), -item[0]
+        ))
+        return result
+
+    def _match(self, ingredient_ids, max_missing):
+        dense = [
+            self._dense[ingredient_id] for ingredient_id in ingredient_ids
+            if ingredient_id in self._dense
+        ]
+        counts = Counter()
+        for ingredient_id in ingredient_ids:
+            counts.update(self._sparse.get(ingredient_id, ()))
+        # Рецепты с редкими ингредиентами: точный подсчёт по каждому.
+        result = []
+        seen = bytearray()
+        for recipe_id, matched in counts.items():
+            set_bit(seen, recipe_id)
+            matched += sum(test_bit(bits, recipe_id) for bits in dense)
+            missing = self._sizes[recipe_id] - matched
+            if missing <= max_missing:
+                result.append((recipe_id, matched, missing))
+        if not dense:
+            return result
+        # Остальные рецепты содержат только частые ингредиенты запроса.
+        # Их число у каждого рецепта складывается побитово: planes[k] -
+        # k-й разряд счётчика сразу для всех рецептов.
+        planes = []
+        found = 0
+        for bits in dense:
+            carry = int.from_bytes(bits, 'little')
+            found |= carry
+            for level, plane in enumerate(planes):
+                planes[level], carry = plane ^ carry, plane & carry
+                if not carry:
+                    break
+            if carry:
+                planes.append(carry)
+        found &= ~int.from_bytes(seen, 'little')
+        for size, size_bits in self._by_size.items():
+            candidates = found & int.from_bytes(size_bits, 'little')
+            if not candidates:
+                continue
+            # Счётчик в planes не больше 2 ** len(planes) - 1: старшие
+            # значения совпали бы с младшими по имеющимся разрядам.
+            top = min(size, len(dense), (1 << len(planes)) - 1)
+            for matched in range(max(size - max_missing, 1), top + 1):
+                mask = candidates
+                for level, plane in enumerate(planes):
+                    mask &= plane if matched >> level & 1 else ~plane
+                result.extend(
+                    (recipe_id, matched, size - matched)
+                    for recipe_id in iter_bits(mask)
+                )
+        return result
+
+
+cookable_index = CookableIndex()
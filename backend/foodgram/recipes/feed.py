@@ -0,0 +1,43 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+from recipes.models import FeedItem
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Один поток: рассылки одного автора не пересекаются.
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='feed-backfill'
+            )
+        return _executor
+
+
+def run_backfill(author_id):
+    try:
+        FeedItem.objects.add_author(author_id)
+    except Exception:
+        logger.exception(
+            'Не удалось разослать рецепты автора %s в ленты', author_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_backfill(author_id):
+    """
+    Ставит рассылку рецептов автора в ленты подписчиков в фоновый
+    поток после коммита: отписка не ждёт вставки подписчики x
+    FEED_BACKFILL_SIZE строк.
+    """
+    transaction.on_commit(
+        lambda: get_executor().submit(run_backfill, author_id))
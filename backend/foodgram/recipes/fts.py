@@ -0,0 +1,108 @@
+from django.db import connections
+
+# Полнотекстовый поиск в SQLite: виртуальная таблица FTS5, rowid
+# которой совпадает с id рецепта, и триггеры, которые её ведут.
+# Текущее определение для restore_sqlite_triggers; миграция
+# 0012_recipe_search хранит свою копию SQL, и изменения здесь требуют
+# новой миграции. SQLite пересоздаёт таблицу при большинстве
+# изменений схемы (AddField, AlterField), и триггеры на ней пропадают,
+# поэтому они восстанавливаются после каждого migrate.
+INGREDIENTS = """
+    (SELECT group_concat(ingredient.name, ' ')
+     FROM recipes_ingredientrecipe link
+     JOIN recipes_ingredient ingredient ON ingredient.id = link.ingredient_id
+     WHERE link.recipe_id = {recipe_id})
+"""
+
+TRIGGERS = {
+    'recipes_recipe_fts_insert': """
+        CREATE TRIGGER recipes_recipe_fts_insert
+        AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+            VALUES (new.id, new.name, new.text, '');
+        END
+    """,
+    'recipes_recipe_fts_update': """
+        CREATE TRIGGER recipes_recipe_fts_update
+        AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+            UPDATE recipes_recipe_fts SET name = new.name, text = new.text
+            WHERE rowid = new.id;
+        END
+    """,
+    'recipes_recipe_fts_delete': """
+        CREATE TRIGGER recipes_recipe_fts_delete
+        AFTER DELETE ON recipes_recipe BEGIN
+            DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+        END
+    """,
+    'recipes_ingredientrecipe_fts_insert': f"""
+        CREATE TRIGGER recipes_ingredientrecipe_fts_insert
+        AFTER INSERT ON recipes_ingredientrecipe BEGIN
+            UPDATE recipes_recipe_fts SET ingredients = coalesce(
+                {INGREDIENTS.format(recipe_id='new.recipe_id')}, '')
+            WHERE rowid = new.recipe_id;
+        END
+    """,
+    'recipes_ingredientrecipe_fts_update': f"""
+        CREATE TRIGGER recipes_ingredientrecipe_fts_update
+        AFTER UPDATE ON recipes_ingredientrecipe BEGIN
+            UPDATE recipes_recipe_fts SET ingredients = coalesce(
+                {INGREDIENTS.format(recipe_id='recipes_recipe_fts.rowid')},
+                '')
+            WHERE rowid IN (old.recipe_id, new.recipe_id);
+        END
+    """,
+    'recipes_ingredientrecipe_fts_delete': f"""
+        CREATE TRIGGER recipes_ingredientrecipe_fts_delete
+        AFTER DELETE ON recipes_ingredientrecipe BEGIN
+            UPDATE recipes_recipe_fts SET ingredients = coalesce(
+                {INGREDIENTS.format(recipe_id='old.recipe_id')}, '')
+            WHERE rowid = old.recipe_id;
+        END
+    """,
+    'recipes_ingredient_fts_update': f"""
+        CREATE TRIGGER recipes_ingredient_fts_update
+        AFTER UPDATE OF name ON recipes_ingredient BEGIN
+            UPDATE recipes_recipe_fts SET ingredients = coalesce(
+                {INGREDIENTS.format(recipe_id='recipes_recipe_fts.rowid')},
+                '')
+            WHERE rowid IN (
+                SELECT recipe_id FROM recipes_ingredientrecipe
+                WHERE ingredient_id = new.id
+            );
+        END
+    """,
+}
+
+FILL = f"""
+    INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+    SELECT id, name, text, coalesce(
+        {INGREDIENTS.format(recipe_id='recipes_recipe.id')}, '')
+    FROM recipes_recipe
+"""
+
+REBUILD = ('DELETE FROM recipes_recipe_fts', FILL)
+
+
+def restore_sqlite_triggers(using='default'):
+    """
+    Создаёт недостающие триггеры FTS5 и, если какие-то пропали,
+    заново заполняет таблицу поиска.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, type FROM sqlite_master "
+            "WHERE name = 'recipes_recipe_fts' OR type = 'trigger'"
+        )
+        existing = {name for name, _ in cursor.fetchall()}
+        if 'recipes_recipe_fts' not in existing:
+            return
+        missing = TRIGGERS.keys() - existing
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        if missing:
+            for statement in REBUILD:
+                cursor.execute(statement)
@@ -0,0 +1,119 @@
+import base64
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from foodgram.settings import (RECIPE_IMAGE_PLACEHOLDER, RECIPE_IMAGE_QUALITY,
+                               RECIPE_IMAGE_WORKERS, RECIPE_PLACEHOLDER_SIZE,
+                               RECIPE_THUMBNAIL_SIZE, RECIPE_WEBP_SIZE)
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images'
+            )
+        return _executor
+
+
+def encode(image, size, image_format, quality=RECIPE_IMAGE_QUALITY):
+    """ Уменьшает копию картинки до size и кодирует в image_format. """
+    image = image.copy()
+    image.thumbnail(size)
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def make_placeholder(image):
+    """
+    Крошечная размытая копия картинки в data URI, которую клиент
+    показывает, пока грузится сама картинка.
+    """
+    data = encode(image, RECIPE_PLACEHOLDER_SIZE, 'WEBP', quality=30)
+    placeholder = (
+        f'data:image/webp;base64,{base64.b64encode(data).decode()}'
+    )
+    max_length = Recipe._meta.get_field('image_placeholder').max_length
+    return placeholder if len(placeholder) <= max_length else ''
+
+
+def generate_variants(recipe_id):
+    """
+    Делает для картинки рецепта уменьшенную копию (JPEG), WebP и,
+    если включено, превью и сохраняет их в рецепт. Старые файлы
+    вариантов удаляются.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    with recipe.image.open('rb') as file:
+        with Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            mode = 'RGBA' if 'transparency' in image.info or (
+                image.mode in ('RGBA', 'LA')) else 'RGB'
+            image = image.convert(mode)
+    thumbnail = encode(image.convert('RGB'), RECIPE_THUMBNAIL_SIZE, 'JPEG')
+    webp = encode(image, RECIPE_WEBP_SIZE, 'WEBP')
+    placeholder = make_placeholder(image) if RECIPE_IMAGE_PLACEHOLDER else ''
+    stale = [
+        field.name for field in (recipe.thumbnail, recipe.image_webp)
+        if field
+    ]
+    name = os.path.splitext(os.path.basename(source))[0]
+    recipe.thumbnail.save(f'{name}.jpg', ContentFile(thumbnail), save=False)
+    recipe.image_webp.save(f'{name}.webp', ContentFile(webp), save=False)
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        thumbnail=recipe.thumbnail.name,
+        image_webp=recipe.image_webp.name,
+        image_placeholder=placeholder
+    )
+    if not updated:
+        # Картинку успели заменить: варианты сделает следующая задача.
+        stale = [recipe.thumbnail.name, recipe.image_webp.name]
+    else:
+        # update() не шлёт сигналов: обновим рецепт для кэша ответов.
+        recipe.save(update_fields=('updated_at',))
+    for name in stale:
+        recipe.image.storage.delete(name)
+
+
+def run_task(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать картинку рецепта %s', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe_id):
+    """ Ставит обработку картинки в пул после коммита транзакции. """
+    transaction.on_commit(
+        lambda: get_executor().submit(run_task, recipe_id))
+
+
+def wait_for_variants():
+    """ Дожидается обработки поставленных в пул картинок и закрывает пул. """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,206 @@
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from recipes.models import (Favorite, FeedItem, Ingredient, IngredientRecipe,
+                            Recipe, ShoppingCartItem, ShoppingList, Tag,
+                            TagRecipe)
+from users.models import Follow, User
+
+# Запрос из горячего пути и таблицы, которые он должен читать только по
+# индексу. vendors - СУБД, где проверка имеет смысл (None - все).
+Check = namedtuple('Check', ('name', 'build', 'tables', 'vendors'))
+
+CHECKS = (
+    Check(
+        'recipe_flags',
+        lambda sample: Recipe.objects.with_user_flags(sample.user)[:10],
+        ('recipes_favorite', 'recipes_shoppinglist'),
+        None
+    ),
+    Check(
+        'author_recipes',
+        lambda sample: Recipe.objects.filter(
+            author=sample.user).order_by('-id')[:10],
+        ('recipes_recipe',),
+        None
+    ),
+    Check(
+        'tag_filter',
+        lambda sample: Recipe.objects.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag__in=sample.tags
+        )))[:10],
+        ('recipes_tagrecipe',),
+        None
+    ),
+    Check(
+        'recipe_tags',
+        lambda sample: TagRecipe.objects.filter(recipe=sample.recipe),
+        ('recipes_tagrecipe',),
+        None
+    ),
+    Check(
+        'recipe_ingredients',
+        lambda sample: IngredientRecipe.objects.filter(
+            recipe=sample.recipe).select_related('ingredient'),
+        ('recipes_ingredientrecipe',),
+        None
+    ),
+    Check(
+        'is_subscribed',
+        lambda sample: Follow.objects.filter(
+            user=sample.user, following=sample.author),
+        ('users_follow',),
+        None
+    ),
+    Check(
+        'subscriptions',
+        lambda sample: User.objects.filter(following__user=sample.user),
+        ('users_follow',),
+        None
+    ),
+    Check(
+        'followers',
+        lambda sample: Follow.objects.filter(
+            following=sample.author).values_list('user_id', flat=True),
+        ('users_follow',),
+        None
+    ),
+    Check(
+        'favorites',
+        lambda sample: Favorite.objects.filter(user=sample.user),
+        ('recipes_favorite',),
+        None
+    ),
+    Check(
+        'shopping_cart',
+        lambda sample: ShoppingCartItem.objects.filter(
+            user=sample.user).values('ingredient', 'total_amount'),
+        ('recipes_shoppingcartitem',),
+        None
+    ),
+    Check(
+        'feed',
+        lambda sample: FeedItem.objects.filter(
+            user=sample.user).values('recipe'),
+        ('recipes_feeditem',),
+        None
+    ),
+    Check(
+        'trending_favorites',
+        lambda sample: Favorite.objects.filter(
+            created__gte=sample.since
+        ).values_list('recipe_id', 'created').order_by(),
+        ('recipes_favorite',),
+        None
+    ),
+    Check(
+        'trending_shopping_lists',
+        lambda sample: ShoppingList.objects.filter(
+            created__gte=sample.since
+        ).values_list('recipe_id', 'created').order_by(),
+        ('recipes_shoppinglist',),
+        None
+    ),
+    # В SQLite LIKE с ESCAPE не использует индексы.
+    Check(
+        'ingredient_prefix',
+        lambda sample: Ingredient.objects.filter(
+            name__istartswith='мука')[:10],
+        ('recipes_ingredient',),
+        ('postgresql',)
+    ),
+)
+
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    # Строки вида "SCAN recipes_favorite AS U0" без "USING INDEX".
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)'),
+}
+
+Sample = namedtuple('Sample', ('user', 'author', 'recipe', 'tags', 'since'))
+
+
+def first_pk(model):
+    return model.objects.order_by('pk').values_list(
+        'pk', flat=True).first() or 1
+
+
+def full_scans(plan, vendor):
+    pattern = SEQ_SCAN[vendor]
+    return {
+        match.group(1)
+        for line in plan.splitlines()
+        for match in [pattern.search(line)] if match
+    }
+
+
+class Command(BaseCommand):
+    help = ('Проверяет планы (EXPLAIN) основных запросов: таблицы, '
+            'которые должны читаться по индексу, не сканируются целиком. '
+            'В PostgreSQL последовательное сканирование отключается, '
+            'чтобы размер таблиц не влиял на выбор плана.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='append',
+            dest='checks',
+            help='Проверить только этот запрос; можно указать '
+                 'несколько раз.'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Показать планы запросов.'
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in SEQ_SCAN:
+            raise CommandError(f'Планы для {vendor} не разбираются.')
+        checks = [
+            check for check in CHECKS
+            if not options['checks'] or check.name in options['checks']
+        ]
+        # Планы строятся и на пустой БД: подойдут несохранённые объекты.
+        user = User.objects.order_by('pk').first() or User(pk=1)
+        sample = Sample(
+            user=user,
+            author=Follow.objects.filter(user=user).values_list(
+                'following', flat=True).first() or user.pk,
+            recipe=first_pk(Recipe),
+            tags=list(Tag.objects.values_list('pk', flat=True)[:3]) or [1],
+            since=timezone.now() - timedelta(days=7),
+        )
+        failures = []
+        for check in checks:
+            if check.vendors and vendor not in check.vendors:
+                self.stdout.write(f'{check.name}: пропущено для {vendor}.')
+                continue
+            with transaction.atomic():
+                if vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = check.build(sample).explain()
+            scanned = full_scans(plan, vendor) & set(check.tables)
+            if options['verbose']:
+                self.stdout.write(plan)
+            if scanned:
+                failures.append(check.name)
+                self.stdout.write(self.style.ERROR(
+                    f'{check.name}: полное сканирование '
+                    f'{", ".join(sorted(scanned))}.'
+                ))
+            else:
+                self.stdout.write(f'{check.name}: ok.')
+        if failures:
+            raise CommandError(
+                f'Запросы без индекса: {", ".join(failures)}.'
+            )
+        self.stdout.write(self.style.SUCCESS('Все запросы идут по индексам.'))
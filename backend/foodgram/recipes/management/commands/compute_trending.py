@@ -0,0 +1,72 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import bump_version
+from foodgram.settings import (TRENDING_HALF_LIFE_HOURS, TRENDING_SIZE,
+                               TRENDING_WEIGHTS, TRENDING_WINDOW_DAYS)
+from recipes.models import Favorite, Recipe, ShoppingList, TrendingRecipe
+
+EVENTS = (
+    (Favorite, 'favorite'),
+    (ShoppingList, 'shopping_cart'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рецепты в тренде по недавним добавлениям '
+            'в избранное и списки покупок. Запускается по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=TRENDING_WINDOW_DAYS,
+            help='За сколько дней учитывать активность.'
+        )
+        parser.add_argument(
+            '--half-life-hours',
+            type=float,
+            default=TRENDING_HALF_LIFE_HOURS,
+            help='Через сколько часов вес события уменьшается вдвое.'
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=TRENDING_SIZE,
+            help='Сколько рецептов сохранить.'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=options['window_days'])
+        half_life = options['half_life_hours'] * 3600
+        scores = defaultdict(float)
+        for model, event in EVENTS:
+            weight = TRENDING_WEIGHTS[event]
+            rows = model.objects.filter(created__gte=since).values_list(
+                'recipe_id', 'created').order_by()
+            for recipe_id, created in rows.iterator(chunk_size=5000):
+                age = (now - created).total_seconds()
+                scores[recipe_id] += weight * 0.5 ** (age / half_life)
+        ranked = sorted(
+            scores.items(), key=lambda item: (-item[1], -item[0])
+        )[:options['size']]
+        with transaction.atomic():
+            # Рецепт могли удалить, пока считались оценки.
+            existing = set(Recipe.objects.filter(
+                pk__in=[recipe_id for recipe_id, _ in ranked]
+            ).values_list('pk', flat=True))
+            ranked = [item for item in ranked if item[0] in existing]
+            TrendingRecipe.objects.all().delete()
+            TrendingRecipe.objects.bulk_create(
+                TrendingRecipe(recipe_id=recipe_id, rank=rank, score=score)
+                for rank, (recipe_id, score) in enumerate(ranked, start=1)
+            )
+        bump_version('recipe')
+        self.stdout.write(self.style.SUCCESS(
+            f'В тренде {len(ranked)} рецептов.'
+        ))
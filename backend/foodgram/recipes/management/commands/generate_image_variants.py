@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт уменьшенные копии и WebP для картинок рецептов, '
+            'например для рецептов, загруженных до появления вариантов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать варианты для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(thumbnail='')
+        recipe_ids = list(recipes.values_list('pk', flat=True).order_by())
+        for number, recipe_id in enumerate(recipe_ids, start=1):
+            try:
+                generate_variants(recipe_id)
+            except OSError as error:
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+            if number % 100 == 0:
+                self.stdout.write(f'Обработано рецептов: {number}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обработано {len(recipe_ids)}.'
+        ))
@@ -1,17 +1,109 @@
+import csv
 import json
+import os
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from recipes.models import Ingredient
 
 
+def iter_json_array(file, chunk_size=64 * 1024):
+    """
+    По одному отдаёт элементы JSON-массива верхнего уровня,
+    не загружая весь файл в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer and not eof:
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            if not buffer.startswith('['):
+                raise ValueError('Ожидается JSON-массив.')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            end = None
+        # Значение, упёршееся в конец буфера (например, число),
+        # может продолжаться в следующем куске файла.
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise ValueError('Неожиданный конец JSON-файла.')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_csv_rows(file):
+    """ Строки CSV вида name,measurement_unit; заголовок необязателен. """
+    for row in csv.reader(file):
+        if not row or row == ['name', 'measurement_unit']:
+            continue
+        name, measurement_unit = row[:2]
+        yield {'name': name, 'measurement_unit': measurement_unit}
+
+
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из JSON- или CSV-файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='ingredients.json',
+            help='Путь к файлу с ингредиентами (.json или .csv).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк вставлять за один запрос.'
+        )
+
     def handle(self, *args, **options):
-        with open('ingredients.json', 'rb') as f:
-            data = json.load(f)
-            for i in data:
-                ingredient = Ingredient()
-                ingredient.name = i['name']
-                ingredient.measurement_unit = i['measurement_unit']
-                ingredient.save()
-                print(i['name'], i['measurement_unit'])
+        path = options['path']
+        batch_size = options['batch_size']
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ('.json', '.csv'):
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        count_before = Ingredient.objects.count()
+        processed = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            if extension == '.json':
+                rows = iter_json_array(file)
+            else:
+                rows = iter_csv_rows(file)
+            while True:
+                batch = [
+                    Ingredient(
+                        name=row['name'].strip(),
+                        measurement_unit=row['measurement_unit'].strip()
+                    )
+                    for row in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                processed += len(batch)
+                self.stdout.write(f'Обработано строк: {processed}')
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обработано {processed}, добавлено {created}.'
+        ))
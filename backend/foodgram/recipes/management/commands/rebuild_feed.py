@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.settings import FEED_FANOUT_MAX_FOLLOWERS
+from recipes.models import FeedItem
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Заново заполняет ленты подписок, например после изменения '
+            'FEED_FANOUT_MAX_FOLLOWERS или FEED_BACKFILL_SIZE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Число авторов в пачке.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        author_ids = list(User.objects.filter(
+            followers_count__gt=0,
+            followers_count__lte=FEED_FANOUT_MAX_FOLLOWERS
+        ).values_list('pk', flat=True).order_by('pk'))
+        with transaction.atomic():
+            FeedItem.objects.all().delete()
+            for start in range(0, len(author_ids), batch_size):
+                FeedItem.objects.add_authors(
+                    author_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedItem.objects.count()}.'
+        ))
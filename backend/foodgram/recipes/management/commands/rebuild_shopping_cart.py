@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingCartItem
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает суммы ингредиентов в списках покупок '
+            'и проверяет их расхождение с рецептами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при записи.'
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (row['user'], row['ingredient']): row['total_amount']
+            for row in ShoppingCartItem.objects.expected_totals().iterator()
+        }
+        stored = {
+            (row['user'], row['ingredient']): row['total_amount']
+            for row in ShoppingCartItem.objects.values(
+                'user', 'ingredient', 'total_amount').iterator()
+        }
+        drift = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        self.stdout.write(
+            f'Строк: {len(expected)}, расхождений: {len(drift)}.'
+        )
+        if options['check']:
+            if drift:
+                raise CommandError('Списки покупок расходятся с рецептами.')
+            return
+        with transaction.atomic():
+            ShoppingCartItem.objects.all().delete()
+            ShoppingCartItem.objects.bulk_create(
+                (
+                    ShoppingCartItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total_amount
+                    )
+                    for (user_id, ingredient_id), total_amount
+                    in expected.items()
+                ),
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны.'))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.cache import bump_version
+from recipes.models import Favorite, Recipe
+from users.models import Follow, User
+
+# (модель, поле счётчика, модель строк, поле связи с моделью)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+)
+
+
+def count_by(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики favorites_count, recipes_count '
+            'и followers_count с данными и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при записи.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_drift = 0
+        for model, field, source, relation in COUNTERS:
+            expected = count_by(source, relation)
+            drift = list(
+                model.objects.annotate(expected=expected)
+                .exclude(**{field: expected})
+                .values_list('pk', flat=True).order_by()
+            )
+            total_drift += len(drift)
+            self.stdout.write(
+                f'{model.__name__}.{field}: расхождений {len(drift)}.'
+            )
+            if options['check']:
+                continue
+            # Пересчёт в самом UPDATE, чтобы не затереть изменения,
+            # сделанные после выборки расходящихся строк.
+            for start in range(0, len(drift), batch_size):
+                model.objects.filter(
+                    pk__in=drift[start:start + batch_size]
+                ).update(**{field: expected})
+        if options['check']:
+            if total_drift:
+                raise CommandError('Счётчики расходятся с данными.')
+            return
+        if total_drift:
+            bump_version('recipe_counters')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_auto_20220613_0012'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientrecipe',
+            options={'ordering': ('-pk',), 'verbose_name': 'Ингредиент рецептов', 'verbose_name_plural': 'Ингредиенты рецептов'},
+        ),
+        migrations.AlterModelOptions(
+            name='tagrecipe',
+            options={'ordering': ('-pk',), 'verbose_name': 'Тег рецептов', 'verbose_name_plural': 'Теги рецептов'},
+        ),
+        migrations.AddIndex(
+            model_name='ingredientrecipe',
+            index=models.Index(fields=['recipe', 'ingredient'], name='ingredientrecipe_recipe_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_cart(apps, schema_editor):
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    ShoppingCartItem = apps.get_model('recipes', 'ShoppingCartItem')
+    totals = ShoppingList.objects.filter(
+        recipe__recipeingredient__isnull=False
+    ).values(
+        'user', ingredient=models.F('recipe__recipeingredient__ingredient')
+    ).annotate(
+        total_amount=models.Sum('recipe__recipeingredient__amount')
+    ).order_by()
+    ShoppingCartItem.objects.bulk_create(
+        (
+            ShoppingCartItem(
+                user_id=row['user'],
+                ingredient_id=row['ingredient'],
+                total_amount=row['total_amount']
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0006_ingredientrecipe_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_item'),
+        ),
+        migrations.RunPython(fill_shopping_cart, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:40
+
+from django.db import migrations
+
+
+# istartswith в PostgreSQL - это UPPER("name"::text) LIKE UPPER('...%').
+# Обычный btree по name такой запрос не использует, нужен индекс
+# по выражению с text_pattern_ops (работает при любой локали БД).
+INDEX_NAME = 'ingredient_name_upper_like_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        f'((UPPER(name::text)) text_pattern_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_shoppingcartitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
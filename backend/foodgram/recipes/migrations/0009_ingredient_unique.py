@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """ Сливает ингредиенты с одинаковыми названием и единицей. """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingCartItem = apps.get_model('recipes', 'ShoppingCartItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=keep_id)
+        IngredientRecipe.objects.filter(
+            ingredient__in=extra).update(ingredient_id=keep_id)
+        for item in ShoppingCartItem.objects.filter(ingredient__in=extra):
+            kept, _ = ShoppingCartItem.objects.get_or_create(
+                user_id=item.user_id, ingredient_id=keep_id
+            )
+            kept.total_amount += item.total_amount
+            kept.save()
+            item.delete()
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_ingredient_name_prefix_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
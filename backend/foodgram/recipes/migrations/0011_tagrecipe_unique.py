@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """ Удаляет повторные привязки тега к рецепту, оставляя первую. """
+    TagRecipe = apps.get_model('recipes', 'TagRecipe')
+    duplicates = TagRecipe.objects.values('tag', 'recipe').annotate(
+        keep_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for duplicate in duplicates:
+        TagRecipe.objects.filter(
+            tag_id=duplicate['tag'], recipe_id=duplicate['recipe']
+        ).exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tagrecipe',
+            constraint=models.UniqueConstraint(fields=('tag', 'recipe'), name='unique_tag_recipe'),
+        ),
+    ]
@@ -0,0 +1,263 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:20
+
+from django.db import migrations
+
+
+# Полнотекстовый поиск по названию, описанию и ингредиентам рецепта.
+# В модели этих объектов нет: они поддерживаются триггерами в БД,
+# а RecipeQuerySet.search() обращается к ним через RawSQL.
+#
+# PostgreSQL: столбец recipes_recipe.search_vector (tsvector) с
+# GIN-индексом. Вес A - название, B - описание, C - ингредиенты.
+# Аргументы recipes_recipe_search_vector: id, название, описание.
+POSTGRES_FORWARD = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    """
+    CREATE FUNCTION recipes_recipe_search_vector(integer, text, text)
+    RETURNS tsvector AS $$
+        SELECT
+            setweight(to_tsvector('russian', coalesce($2, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce($3, '')), 'B')
+            || setweight(to_tsvector('russian', coalesce((
+                SELECT string_agg(ingredient.name, ' ')
+                FROM recipes_ingredientrecipe link
+                JOIN recipes_ingredient ingredient
+                    ON ingredient.id = link.ingredient_id
+                WHERE link.recipe_id = $1
+            ), '')), 'C')
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE FUNCTION recipes_recipe_search_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := recipes_recipe_search_vector(
+            NEW.id, NEW.name, NEW.text
+        );
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_update
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_trigger()
+    """,
+    # Ингредиенты рецепта меняются пачками (bulk_create/bulk_update),
+    # поэтому триггеры на связях - на весь оператор, а не на строку.
+    """
+    CREATE FUNCTION recipes_ingredientrecipe_search_trigger()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE recipes_recipe SET search_vector =
+                recipes_recipe_search_vector(id, name, text)
+            WHERE id IN (SELECT recipe_id FROM new_rows);
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE recipes_recipe SET search_vector =
+                recipes_recipe_search_vector(id, name, text)
+            WHERE id IN (SELECT recipe_id FROM old_rows);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_search_insert
+    AFTER INSERT ON recipes_ingredientrecipe
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE recipes_ingredientrecipe_search_trigger()
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_search_update
+    AFTER UPDATE ON recipes_ingredientrecipe
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE recipes_ingredientrecipe_search_trigger()
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_search_delete
+    AFTER DELETE ON recipes_ingredientrecipe
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE recipes_ingredientrecipe_search_trigger()
+    """,
+    """
+    CREATE FUNCTION recipes_ingredient_search_trigger() RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe SET search_vector =
+            recipes_recipe_search_vector(id, name, text)
+        WHERE id IN (
+            SELECT recipe_id FROM recipes_ingredientrecipe
+            WHERE ingredient_id = NEW.id
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_ingredient_search_update
+    AFTER UPDATE OF name ON recipes_ingredient
+    FOR EACH ROW EXECUTE PROCEDURE recipes_ingredient_search_trigger()
+    """,
+    """
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text)
+    """,
+    """
+    CREATE INDEX recipes_recipe_search_idx
+    ON recipes_recipe USING GIN (search_vector)
+    """,
+)
+
+POSTGRES_BACKWARD = (
+    'DROP TRIGGER IF EXISTS recipes_ingredient_search_update '
+    'ON recipes_ingredient',
+    'DROP FUNCTION IF EXISTS recipes_ingredient_search_trigger()',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_search_delete '
+    'ON recipes_ingredientrecipe',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_search_update '
+    'ON recipes_ingredientrecipe',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_search_insert '
+    'ON recipes_ingredientrecipe',
+    'DROP FUNCTION IF EXISTS recipes_ingredientrecipe_search_trigger()',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_update ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_trigger()',
+    'DROP FUNCTION IF EXISTS '
+    'recipes_recipe_search_vector(integer, text, text)',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+# SQLite (разработка и тесты): виртуальная таблица FTS5, rowid которой
+# совпадает с id рецепта, и триггеры, которые её ведут. Текущее
+# определение - в recipes.fts, откуда триггеры восстанавливает
+# post_migrate; здесь - копия на момент миграции.
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE recipes_recipe_fts '
+    'USING fts5(name, text, ingredients)',
+    """
+    CREATE TRIGGER recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+        VALUES (new.id, new.name, new.text, '');
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        UPDATE recipes_recipe_fts SET name = new.name, text = new.text
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_fts_insert
+    AFTER INSERT ON recipes_ingredientrecipe BEGIN
+        UPDATE recipes_recipe_fts SET ingredients = coalesce((
+            SELECT group_concat(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe link
+            JOIN recipes_ingredient ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = new.recipe_id
+        ), '')
+        WHERE rowid = new.recipe_id;
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_fts_update
+    AFTER UPDATE ON recipes_ingredientrecipe BEGIN
+        UPDATE recipes_recipe_fts SET ingredients = coalesce((
+            SELECT group_concat(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe link
+            JOIN recipes_ingredient ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = recipes_recipe_fts.rowid
+        ), '')
+        WHERE rowid IN (old.recipe_id, new.recipe_id);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_fts_delete
+    AFTER DELETE ON recipes_ingredientrecipe BEGIN
+        UPDATE recipes_recipe_fts SET ingredients = coalesce((
+            SELECT group_concat(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe link
+            JOIN recipes_ingredient ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = old.recipe_id
+        ), '')
+        WHERE rowid = old.recipe_id;
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_ingredient_fts_update
+    AFTER UPDATE OF name ON recipes_ingredient BEGIN
+        UPDATE recipes_recipe_fts SET ingredients = coalesce((
+            SELECT group_concat(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe link
+            JOIN recipes_ingredient ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = recipes_recipe_fts.rowid
+        ), '')
+        WHERE rowid IN (
+            SELECT recipe_id FROM recipes_ingredientrecipe
+            WHERE ingredient_id = new.id
+        );
+    END
+    """,
+    """
+    INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+    SELECT id, name, text, coalesce((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_ingredientrecipe link
+        JOIN recipes_ingredient ingredient
+            ON ingredient.id = link.ingredient_id
+        WHERE link.recipe_id = recipes_recipe.id
+    ), '')
+    FROM recipes_recipe
+    """,
+)
+SQLITE_BACKWARD = (
+    'DROP TRIGGER IF EXISTS recipes_ingredient_fts_update',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_fts_update',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def create_search(apps, schema_editor):
+    forward, _ = STATEMENTS.get(schema_editor.connection.vendor, ((), ()))
+    for statement in forward:
+        schema_editor.execute(statement)
+
+
+def drop_search(apps, schema_editor):
+    _, backward = STATEMENTS.get(schema_editor.connection.vendor, ((), ()))
+    for statement in backward:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_tagrecipe_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:49
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from foodgram.settings import FEED_BACKFILL_SIZE, FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fill_feeds(apps, schema_editor):
+    """
+    Заполняет ленты существующих подписок: последние FEED_BACKFILL_SIZE
+    рецептов авторов с числом подписчиков не больше порога.
+    """
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedItem = apps.get_model('recipes', 'FeedItem')
+    author_ids = list(User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lte=FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('pk', flat=True).order_by('pk'))
+    for start in range(0, len(author_ids), 1000):
+        recipe_ids = defaultdict(list)
+        recipes = Recipe.objects.filter(
+            author_id__in=author_ids[start:start + 1000]
+        ).order_by('author_id', '-pk').values_list('author_id', 'pk')
+        for author_id, recipe_id in recipes.iterator():
+            if len(recipe_ids[author_id]) < FEED_BACKFILL_SIZE:
+                recipe_ids[author_id].append(recipe_id)
+        followers = Follow.objects.filter(
+            following_id__in=list(recipe_ids)
+        ).values_list('following_id', 'user_id').order_by()
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    user_id=user_id,
+                    author_id=author_id,
+                    recipe_id=recipe_id
+                )
+                for author_id, user_id in followers.iterator()
+                for recipe_id in recipe_ids[author_id]
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0014_trending'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи лент',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'author'], name='feeditem_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_item'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_placeholder',
+            field=models.CharField(blank=True, editable=False, help_text='Крошечная копия картинки в data URI', max_length=1000, verbose_name='Превью изображения'),
+        ),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:03
+
+import logging
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Аудит индексов. Составные индексы и ограничения добавляются раньше,
+# чем удаляются одиночные индексы внешних ключей, которые они покрывают
+# (первый столбец составного индекса обслуживает те же запросы):
+# recipe.author - unique_recipes (author, id), в том числе страницы
+# автора по убыванию id; favorite.user, shoppinglist.user - их
+# unique (user, recipe); ingredientrecipe.recipe -
+# unique_ingredient_recipe; tagrecipe.tag - unique_tag_recipe;
+# shoppingcartitem.user, feeditem.user - их unique (user, ...).
+# Индекс для поиска ингредиентов по началу названия уже создан
+# миграцией 0008_ingredient_name_prefix_idx.
+
+# Наибольшее значение PositiveSmallIntegerField IngredientRecipe.amount.
+AMOUNT_MAX = 32767
+
+# В SQLite таблица ingredientrecipe пересоздаётся, а триггер на
+# recipes_ingredient ссылается на неё и мешает переименованию. Триггер
+# удаляется до пересоздания в обе стороны, restore_sqlite_triggers
+# вернёт его после migrate.
+SQLITE_TRIGGER = 'DROP TRIGGER IF EXISTS recipes_ingredient_fts_update'
+
+logger = logging.getLogger(__name__)
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Складывает повторные строки ингредиента в рецепте в одну:
+    суммы в списках покупок от этого не меняются. Сумма больше
+    AMOUNT_MAX в поле не помещается и урезается - такие строки
+    попадают в журнал, чтобы их можно было поправить вручную.
+    """
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    duplicates = IngredientRecipe.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        keep_id=models.Min('id'), total=models.Count('id'),
+        total_amount=models.Sum('amount')
+    ).filter(total__gt=1).order_by()
+    for duplicate in duplicates:
+        amount = duplicate['total_amount']
+        if amount > AMOUNT_MAX:
+            logger.warning(
+                'Рецепт %s, ингредиент %s: сумма %s урезана до %s',
+                duplicate['recipe'], duplicate['ingredient'], amount,
+                AMOUNT_MAX
+            )
+            amount = AMOUNT_MAX
+        IngredientRecipe.objects.filter(id=duplicate['keep_id']).update(
+            amount=amount
+        )
+        IngredientRecipe.objects.filter(
+            recipe_id=duplicate['recipe'],
+            ingredient_id=duplicate['ingredient']
+        ).exclude(id=duplicate['keep_id']).delete()
+
+
+def drop_sqlite_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(SQLITE_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0017_recipe_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RunPython(drop_sqlite_trigger, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredientrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingredient_recipe'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['created', 'recipe'], name='favorite_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['created', 'recipe'], name='shoppinglist_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tagrecipe',
+            index=models.Index(fields=['recipe', 'tag'], name='tagrecipe_recipe_tag_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredientrecipe',
+            name='ingredientrecipe_recipe_idx',
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='Укажите пользователя', on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='feeditem',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, help_text='Укажите рецепт', on_delete=django.db.models.deletion.CASCADE, related_name='recipeingredient', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, help_text='Укажите автора', on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcartitem',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='Укажите пользователя', on_delete=django.db.models.deletion.CASCADE, related_name='shoppinglist', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='tagrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, help_text='Укажите рецепт', on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='tagrecipe',
+            name='tag',
+            field=models.ForeignKey(db_index=False, help_text='Выберите тег', on_delete=django.db.models.deletion.CASCADE, to='recipes.tag', verbose_name='Тег'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, drop_sqlite_trigger),
+    ]
@@ -1,8 +1,16 @@
-from django.db import models
+import re
+from collections import defaultdict
+
+from django.db import connections, models
+from django.db.models import (Case, Exists, F, FloatField, OuterRef,
+                              Prefetch, Q, Subquery, Sum, Value, When, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator
 
-from users.models import User
-from foodgram.settings import MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT
+from users.models import CounterFieldsMixin, User, Follow
+from foodgram.settings import (FEED_BACKFILL_SIZE, FEED_FANOUT_MAX_FOLLOWERS,
+                               MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT)
 
 
 class Tag(models.Model):
@@ -25,6 +33,11 @@ class Tag(models.Model):
         null=True,
 
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         ordering = ('-pk',)
@@ -48,21 +61,149 @@ class Ingredient(models.Model):
         verbose_name='Единица измерения',
         help_text='Укажите идиницу измерения'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """ Флаги is_favorited/is_in_shopping_cart для пользователя. """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        )
+
+    def for_serialization(self, user):
+        """ Подгружает всё, что нужно GetRecipeSerializer, без N+1. """
+        if user.is_authenticated:
+            authors = User.objects.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, following=OuterRef('pk'))
+            ))
+        else:
+            authors = User.objects.annotate(is_subscribed=Value(False))
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags',
+            Prefetch(
+                'recipeingredient',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+
+    def first_per_author(self, limit):
+        """
+        Не больше limit первых рецептов каждого автора из выборки.
+        Нумерация внутри автора - оконной функцией, всё одним запросом.
+        """
+        ranked = self.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=F('id').asc()
+        )).values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s',
+            (*params, limit)
+        ))
+
+    def feed(self, user):
+        """
+        Рецепты авторов, на которых подписан пользователь: из его ленты
+        FeedItem и напрямую у авторов, чьи рецепты по ленте не
+        рассылаются из-за числа подписчиков.
+        """
+        popular_authors = Follow.objects.filter(
+            user=user,
+            following__followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS
+        ).values('following')
+        return self.filter(
+            Q(pk__in=FeedItem.objects.filter(user=user).values('recipe'))
+            | Q(author__in=popular_authors)
+        )
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию, описанию и ингредиентам
+        с ранжированием по релевантности (поле search_rank).
+        Индекс ведётся триггерами из миграции 0012_recipe_search.
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return self.annotate(
+                search_rank=Value(0.0, output_field=FloatField()))
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql':
+            tsquery = "plainto_tsquery('russian', %s)"
+            text = ' '.join(words)
+            queryset = self.filter(pk__in=RawSQL(
+                f'SELECT id FROM recipes_recipe '
+                f'WHERE search_vector @@ {tsquery}', (text,)
+            )).annotate(search_rank=RawSQL(
+                f'ts_rank(recipes_recipe.search_vector, {tsquery})',
+                (text,), output_field=FloatField()
+            ))
+        elif vendor == 'sqlite':
+            match = ' '.join(f'"{word}"' for word in words)
+            queryset = self.filter(pk__in=RawSQL(
+                'SELECT rowid FROM recipes_recipe_fts '
+                'WHERE recipes_recipe_fts MATCH %s', (match,)
+            )).annotate(search_rank=RawSQL(
+                # Веса столбцов - как A/B/C у tsvector в PostgreSQL.
+                'SELECT -bm25(recipes_recipe_fts, 10.0, 5.0, 1.0) '
+                'FROM recipes_recipe_fts '
+                'WHERE recipes_recipe_fts MATCH %s '
+                'AND rowid = recipes_recipe.id',
+                (match,), output_field=FloatField()
+            ))
+        else:
+            condition = Q()
+            for word in words:
+                condition &= (
+                    Q(name__icontains=word)
+                    | Q(text__icontains=word)
+                    | Q(Exists(IngredientRecipe.objects.filter(
+                        recipe=OuterRef('pk'), ingredient__name__icontains=word
+                    )))
+                )
+            queryset = self.filter(condition).annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            )
+        return queryset.order_by('-search_rank', '-pk')
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         related_name='recipes',
         on_delete=models.CASCADE,
+        # Рецепты автора по убыванию id читаются по unique_recipes.
+        db_index=False,
         verbose_name='Автор рецепта',
         help_text='Укажите автора',
     )
@@ -77,6 +218,25 @@ class Recipe(models.Model):
         upload_to='recipes/',
 
     )
+    thumbnail = models.ImageField(
+        blank=True,
+        editable=False,
+        upload_to='recipes/thumbnails/',
+        verbose_name='Уменьшенное изображение'
+    )
+    image_webp = models.ImageField(
+        blank=True,
+        editable=False,
+        upload_to='recipes/webp/',
+        verbose_name='Изображение WebP'
+    )
+    image_placeholder = models.CharField(
+        max_length=1000,
+        blank=True,
+        editable=False,
+        verbose_name='Превью изображения',
+        help_text='Крошечная копия картинки в data URI'
+    )
     text = models.TextField(
         max_length=1000,
         verbose_name='Описание',
@@ -106,6 +266,19 @@ class Recipe(models.Model):
                         f'{MIN_COOKING_TIME} минут'),
         ),
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+
+    counter_fields = ('favorites_count',)
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pk',)
@@ -117,6 +290,12 @@ class Recipe(models.Model):
                 name='unique_recipes'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popularity_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -129,6 +308,7 @@ class IngredientRecipe(models.Model):
         verbose_name='Рецепт',
         help_text='Укажите рецепт',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -153,6 +333,12 @@ class IngredientRecipe(models.Model):
         ordering = ('-pk',)
         verbose_name = 'Ингредиент рецептов'
         verbose_name_plural = 'Ингредиенты рецептов'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_ingredient_recipe'
+            ),
+        )
 
     def __str__(self):
         return self.recipe.name
@@ -164,16 +350,31 @@ class TagRecipe(models.Model):
         verbose_name='Рецепт',
         help_text='Укажите рецепт',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     tag = models.ForeignKey(
         Tag,
         help_text='Выберите тег',
         verbose_name='Тег',
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
     class Meta:
         ordering = ('-pk',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('tag', 'recipe'),
+                name='unique_tag_recipe'
+            ),
+        )
+        # Теги рецептов и фильтр по тегам (EXISTS по recipe и tag).
+        indexes = (
+            models.Index(
+                fields=('recipe', 'tag'),
+                name='tagrecipe_recipe_tag_idx'
+            ),
+        )
         verbose_name = 'Тег рецептов'
         verbose_name_plural = 'Теги рецептов'
 
@@ -186,6 +387,7 @@ class Favorite(models.Model):
         User,
         related_name='favorites',
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Пользователь',
         help_text='Укажите пользователя'
     )
@@ -196,6 +398,10 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         help_text='Выберите рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         ordering = ('-pk',)
@@ -205,6 +411,13 @@ class Favorite(models.Model):
                 name='unique_favorites'
             ),
         )
+        # Недавние события для compute_trending без чтения таблицы.
+        indexes = (
+            models.Index(
+                fields=('created', 'recipe'),
+                name='favorite_created_idx'
+            ),
+        )
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
 
@@ -217,6 +430,7 @@ class ShoppingList(models.Model):
         User,
         related_name='shoppinglist',
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Пользователь',
         help_text='Укажите пользователя'
     )
@@ -227,6 +441,10 @@ class ShoppingList(models.Model):
         verbose_name='Рецепт',
         help_text='Опишите рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         ordering = ('-pk',)
@@ -236,8 +454,300 @@ class ShoppingList(models.Model):
                 name='unique_shopping_list'
             ),
         )
+        # Недавние события для compute_trending без чтения таблицы.
+        indexes = (
+            models.Index(
+                fields=('created', 'recipe'),
+                name='shoppinglist_created_idx'
+            ),
+        )
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
 
     def __str__(self):
         return f'{self.recipe} добавлен в список покупок {self.user}'
+
+
+class ShoppingCartItemQuerySet(models.QuerySet):
+    def add_recipe(self, user_id, recipe_id):
+        """ Прибавляет ингредиенты рецепта к списку покупок пользователя. """
+        ingredient_ids = list(IngredientRecipe.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient', flat=True))
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for ingredient_id in ingredient_ids
+            ),
+            ignore_conflicts=True
+        )
+        self._shift(user_id, recipe_id, ingredient_ids, 1)
+
+    def remove_recipe(self, user_id, recipe_id):
+        """ Вычитает ингредиенты рецепта из списка покупок пользователя. """
+        ingredient_ids = IngredientRecipe.objects.filter(
+            recipe_id=recipe_id).values('ingredient')
+        self._shift(user_id, recipe_id, ingredient_ids, -1)
+
+    def _shift(self, user_id, recipe_id, ingredient_ids, sign):
+        amount = Subquery(IngredientRecipe.objects.filter(
+            recipe_id=recipe_id, ingredient=OuterRef('ingredient')
+        ).values('amount')[:1])
+        self.filter(user_id=user_id, ingredient__in=ingredient_ids).update(
+            total_amount=F('total_amount') + sign * amount
+        )
+        self.filter(user_id=user_id, total_amount__lte=0).delete()
+
+    def apply_recipe_changes(self, recipe, deltas):
+        """
+        Применяет изменения ингредиентов рецепта ко всем спискам покупок,
+        в которых он лежит. deltas: {id ингредиента: изменение количества}.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+        user_ids = list(ShoppingList.objects.filter(
+            recipe=recipe).values_list('user', flat=True))
+        if not user_ids:
+            return
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ),
+            ignore_conflicts=True
+        )
+        self.filter(user_id__in=user_ids, ingredient_id__in=deltas).update(
+            total_amount=F('total_amount') + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0)
+            )
+        )
+        self.filter(user_id__in=user_ids, total_amount__lte=0).delete()
+
+    def apply_composition_changes(self, before, after):
+        """
+        Применяет к спискам покупок разницу двух снимков состава
+        рецептов {(id рецепта, id ингредиента): количество}.
+        """
+        deltas = {}
+        for key in before.keys() | after.keys():
+            delta = after.get(key, 0) - before.get(key, 0)
+            if delta:
+                recipe_id, ingredient_id = key
+                deltas.setdefault(recipe_id, {})[ingredient_id] = delta
+        for recipe_id, recipe_deltas in deltas.items():
+            self.apply_recipe_changes(recipe_id, recipe_deltas)
+
+    def expected_totals(self):
+        """ Суммы, посчитанные заново по спискам покупок. """
+        return ShoppingList.objects.filter(
+            recipe__recipeingredient__isnull=False
+        ).values(
+            'user',
+            ingredient=F('recipe__recipeingredient__ingredient')
+        ).annotate(
+            total_amount=Sum('recipe__recipeingredient__amount')
+        ).order_by()
+
+
+class ShoppingCartItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_cart_items',
+        on_delete=models.CASCADE,
+        db_index=False,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_cart_items',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingCartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_item'
+            ),
+        )
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+
+    def __str__(self):
+        return f'{self.ingredient}: {self.total_amount} ({self.user})'
+
+
+class TrendingRecipe(models.Model):
+    """
+    Рецепты в тренде: заранее посчитанный рейтинг по недавним
+    добавлениям в избранное и списки покупок (команда
+    compute_trending).
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        related_name='trending',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    rank = models.PositiveIntegerField(
+        db_index=True,
+        verbose_name='Место'
+    )
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        ordering = ('rank',)
+        verbose_name = 'Рецепт в тренде'
+        verbose_name_plural = 'Рецепты в тренде'
+
+    def __str__(self):
+        return f'{self.rank}. {self.recipe}'
+
+
+class FeedItemQuerySet(models.QuerySet):
+    def add_recipe(self, recipe):
+        """ Рассылает новый рецепт в ленты подписчиков автора. """
+        followers_count = User.objects.filter(
+            pk=recipe.author_id).values_list('followers_count', flat=True)
+        if not followers_count or (
+                followers_count[0] > FEED_FANOUT_MAX_FOLLOWERS):
+            return
+        followers = Follow.objects.filter(
+            following_id=recipe.author_id).values_list('user_id', flat=True)
+        self.bulk_create(
+            (
+                FeedItem(
+                    user_id=user_id,
+                    author_id=recipe.author_id,
+                    recipe_id=recipe.id
+                )
+                for user_id in followers.iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def add_follow(self, user_id, author_id):
+        """ Добавляет в ленту последние рецепты нового автора. """
+        followers_count = User.objects.filter(
+            pk=author_id).values_list('followers_count', flat=True)
+        if not followers_count or (
+                followers_count[0] > FEED_FANOUT_MAX_FOLLOWERS):
+            return
+        recipe_ids = Recipe.objects.filter(author_id=author_id).order_by(
+            '-pk').values_list('pk', flat=True)[:FEED_BACKFILL_SIZE]
+        self.bulk_create(
+            (
+                FeedItem(
+                    user_id=user_id,
+                    author_id=author_id,
+                    recipe_id=recipe_id
+                )
+                for recipe_id in recipe_ids
+            ),
+            ignore_conflicts=True
+        )
+
+    def add_author(self, author_id):
+        """
+        Рассылает последние рецепты автора всем его подписчикам, когда
+        число подписчиков опустилось до FEED_FANOUT_MAX_FOLLOWERS:
+        feed() больше не читает рецепты автора напрямую, а опубликованные
+        до этого в ленты не рассылались.
+        """
+        self.add_authors([author_id])
+
+    def add_authors(self, author_ids, batch_size=1000):
+        """
+        Рассылает последние FEED_BACKFILL_SIZE рецептов каждого автора
+        его подписчикам: по одному запросу на рецепты и подписки всей
+        пачки авторов и вставка пачками.
+        """
+        recipe_ids = defaultdict(list)
+        recipes = Recipe.objects.filter(author_id__in=author_ids).order_by(
+            'author_id', '-pk').values_list('author_id', 'pk')
+        for author_id, recipe_id in recipes.iterator():
+            if len(recipe_ids[author_id]) < FEED_BACKFILL_SIZE:
+                recipe_ids[author_id].append(recipe_id)
+        followers = Follow.objects.filter(
+            following_id__in=list(recipe_ids)
+        ).values_list('following_id', 'user_id').order_by()
+        self.bulk_create(
+            (
+                FeedItem(
+                    user_id=user_id,
+                    author_id=author_id,
+                    recipe_id=recipe_id
+                )
+                for author_id, user_id in followers.iterator()
+                for recipe_id in recipe_ids[author_id]
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+
+    def remove_follow(self, user_id, author_id):
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class FeedItem(models.Model):
+    """
+    Лента подписок: рецепт автора, записанный каждому подписчику при
+    публикации (fan-out on write). Авторы с числом подписчиков больше
+    FEED_FANOUT_MAX_FOLLOWERS не рассылаются и читаются напрямую.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='feed_items',
+        on_delete=models.CASCADE,
+        db_index=False,
+        verbose_name='Подписчик'
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Автор'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_items',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+
+    objects = FeedItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'),
+                name='feeditem_user_author_idx'
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.autocomplete import ingredient_catalog
+from recipes.cookable import cookable_index
+from recipes.fts import restore_sqlite_triggers
+from recipes.models import (Favorite, FeedItem, Ingredient,
+                            IngredientRecipe, Recipe, ShoppingList,
+                            ShoppingCartItem)
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_shopping_cart(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_shopping_cart(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты
+    # ещё не удалены и вычитаемое количество известно.
+    ShoppingCartItem.objects.remove_recipe(
+        instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    ingredient_catalog.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_cookable_index(sender, instance, **kwargs):
+    # Ингредиенты пишутся после рецепта (bulk_create в сериализаторе,
+    # инлайны в админке), поэтому состав читается после коммита.
+    recipe_id = instance.pk
+    transaction.on_commit(
+        lambda: cookable_index.refresh_recipe(recipe_id))
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def refresh_cookable_ingredients(sender, instance, **kwargs):
+    # Строки состава, изменённые без сохранения рецепта (админка).
+    # QuerySet.update и bulk_create сигналов не шлют: такие изменения
+    # подхватит перестроение индекса по TTL.
+    recipe_id = instance.recipe_id
+    transaction.on_commit(
+        lambda: cookable_index.refresh_recipe(recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_cookable_index(sender, instance, **kwargs):
+    # К коммиту внешней транзакции Collector уже обнулит instance.pk.
+    recipe_id = instance.pk
+    transaction.on_commit(
+        lambda: cookable_index.remove_recipe(recipe_id))
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        pk=instance.recipe_id, favorites_count__gt=0
+    ).update(favorites_count=F('favorites_count') - 1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    User.objects.filter(
+        pk=instance.author_id, recipes_count__gt=0
+    ).update(recipes_count=F('recipes_count') - 1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        FeedItem.objects.add_recipe(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        FeedItem.objects.add_follow(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_feed(sender, instance, **kwargs):
+    FeedItem.objects.remove_follow(instance.user_id, instance.following_id)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        restore_sqlite_triggers(using)
@@ -0,0 +1,434 @@
+import base64
+import random
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.cookable import CookableIndex
+from recipes.feed import run_backfill
+from recipes.images import generate_variants, run_task
+from recipes.models import (Favorite, FeedItem, Ingredient,
+                            IngredientRecipe, Recipe, ShoppingCartItem,
+                            ShoppingList, Tag)
+from users.models import Follow, User
+
+
+class QueryPlanTests(TestCase):
+    """
+    Основные запросы читают таблицы по индексам (EXPLAIN). Планы
+    PostgreSQL проверяются с выключенным последовательным
+    сканированием, планы SQLite - как есть.
+    """
+
+    @skipUnlessDBFeature('supports_explaining_query_execution')
+    def test_hot_queries_use_indexes(self):
+        output = StringIO()
+        call_command('check_query_plans', stdout=output)
+        self.assertIn('ok.', output.getvalue())
+        if connection.vendor == 'postgresql':
+            self.assertIn('ingredient_prefix: ok.', output.getvalue())
+
+
+@mock.patch('recipes.models.FEED_FANOUT_MAX_FOLLOWERS', 1)
+@mock.patch('users.signals.FEED_FANOUT_MAX_FOLLOWERS', 1)
+class FeedFanoutTests(TestCase):
+    """
+    Рецепты, опубликованные автором с числом подписчиков выше порога,
+    попадают в ленты, когда подписчиков становится не больше порога.
+    """
+
+    def test_backfill_when_author_drops_below_threshold(self):
+        author, first, second = (
+            User.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name
+            )
+            for name in ('author', 'first', 'second')
+        )
+        Follow.objects.create(user=first, following=author)
+        Follow.objects.create(user=second, following=author)
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        self.assertFalse(FeedItem.objects.filter(recipe=recipe).exists())
+        self.assertIn(recipe, Recipe.objects.feed(second))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Follow.objects.filter(user=first).delete()
+        # Рассылка идёт в фоновом потоке после коммита, а не в отписке.
+        self.assertFalse(FeedItem.objects.filter(recipe=recipe).exists())
+        with mock.patch('recipes.feed.get_executor') as get_executor:
+            for callback in callbacks:
+                callback()
+        get_executor().submit.assert_called_once_with(
+            run_backfill, author.pk)
+        FeedItem.objects.add_author(author.pk)
+
+        self.assertTrue(FeedItem.objects.filter(
+            user=second, recipe=recipe).exists())
+        self.assertIn(recipe, Recipe.objects.feed(second))
+        self.assertNotIn(recipe, Recipe.objects.feed(first))
+
+    @mock.patch('recipes.models.FEED_BACKFILL_SIZE', 2)
+    @mock.patch(
+        'recipes.management.commands.rebuild_feed.FEED_FANOUT_MAX_FOLLOWERS',
+        1
+    )
+    def test_rebuild_feed(self):
+        authors = [
+            User.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name
+            )
+            for name in ('author', 'popular', 'first', 'second')
+        ]
+        author, popular, first, second = authors
+        for user in (first, second):
+            Follow.objects.create(user=user, following=popular)
+        Follow.objects.create(user=first, following=author)
+        for index in range(3):
+            for user in (author, popular):
+                Recipe.objects.create(
+                    author=user, name=f'Рецепт {index}', text='Описание',
+                    cooking_time=10, image='recipes/images/test.png'
+                )
+        FeedItem.objects.all().delete()
+
+        call_command('rebuild_feed', batch_size=1, stdout=StringIO())
+
+        # Только последние FEED_BACKFILL_SIZE рецептов автора с числом
+        # подписчиков не больше порога.
+        latest = list(Recipe.objects.filter(
+            author=author).order_by('-pk').values_list('pk', flat=True)[:2])
+        self.assertCountEqual(
+            FeedItem.objects.values_list('user', 'recipe'),
+            [(first.pk, recipe_id) for recipe_id in latest]
+        )
+
+
+class AdminShoppingCartTests(TestCase):
+    """ Правки ингредиентов в админке меняют суммы в списках покупок. """
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='pass',
+            first_name='admin', last_name='admin'
+        )
+        self.client.force_login(self.admin)
+        self.recipe = Recipe.objects.create(
+            author=self.admin, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        self.flour, self.sugar, self.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар', 'соль')
+        )
+        IngredientRecipe.objects.bulk_create((
+            IngredientRecipe(
+                recipe=self.recipe, ingredient=self.flour, amount=100),
+            IngredientRecipe(
+                recipe=self.recipe, ingredient=self.sugar, amount=50),
+        ))
+        self.rows = list(IngredientRecipe.objects.order_by('pk'))
+        ShoppingList.objects.create(user=self.admin, recipe=self.recipe)
+
+    def totals(self):
+        return dict(ShoppingCartItem.objects.filter(
+            user=self.admin).values_list('ingredient__name', 'total_amount'))
+
+    def test_recipe_inline_changes(self):
+        prefix = 'recipeingredient'
+        data = {
+            'author': self.admin.pk,
+            'name': self.recipe.name,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            f'{prefix}-TOTAL_FORMS': 3,
+            f'{prefix}-INITIAL_FORMS': 2,
+            'tagrecipe_set-TOTAL_FORMS': 0,
+            'tagrecipe_set-INITIAL_FORMS': 0,
+        }
+        forms = (
+            (self.rows[0].pk, self.flour, 150, False),
+            (self.rows[1].pk, self.sugar, 50, True),
+            ('', self.salt, 5, False),
+        )
+        for index, (pk, ingredient, amount, delete) in enumerate(forms):
+            data.update({
+                f'{prefix}-{index}-id': pk,
+                f'{prefix}-{index}-recipe': self.recipe.pk,
+                f'{prefix}-{index}-ingredient': ingredient.pk,
+                f'{prefix}-{index}-amount': amount,
+            })
+            if delete:
+                data[f'{prefix}-{index}-DELETE'] = 'on'
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.recipe.pk}/change/', data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals(), {'мука': 150, 'соль': 5})
+
+    def test_ingredient_recipe_delete(self):
+        response = self.client.post(
+            f'/admin/recipes/ingredientrecipe/{self.rows[0].pk}/delete/',
+            {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals(), {'сахар': 50})
+
+
+class CookableIndexTests(TestCase):
+    """
+    Подбор рецептов по продуктам совпадает с прямым подсчётом по
+    множествам, индекс следует за правками состава и перестраивается
+    в фоне.
+    """
+
+    def naive_match(self, compositions, ingredient_ids, max_missing):
+        result = []
+        for recipe_id, composition in compositions.items():
+            matched = len(composition & ingredient_ids)
+            missing = len(composition) - matched
+            if matched and missing <= max_missing:
+                result.append((recipe_id, matched, missing))
+        return sorted(result)
+
+    def test_match_agrees_with_sets(self):
+        rng = random.Random(15)
+        # Ингредиенты 1-4 частые (битовые карты), остальные редкие.
+        compositions = {
+            recipe_id: (
+                {ingredient for ingredient in range(1, 5)
+                 if rng.random() < 0.6}
+                | set(rng.sample(range(5, 200), rng.randint(0, 10)))
+            )
+            for recipe_id in range(1, 301)
+        }
+        index = CookableIndex()
+        index._swap(index._build(sorted(
+            (ingredient_id, recipe_id)
+            for recipe_id, composition in compositions.items()
+            for ingredient_id in composition
+        )))
+        self.assertTrue(index._dense)
+        for _ in range(300):
+            ingredient_ids = (
+                set(rng.sample(range(1, 5), rng.randint(0, 4)))
+                | set(rng.sample(range(5, 200), rng.randint(0, 15)))
+            )
+            max_missing = rng.randint(0, 5)
+            with self.subTest(ingredients=sorted(ingredient_ids),
+                              missing=max_missing):
+                self.assertEqual(
+                    sorted(index.match(ingredient_ids, max_missing)),
+                    self.naive_match(compositions, ingredient_ids,
+                                     max_missing)
+                )
+
+    @mock.patch('recipes.signals.cookable_index', new_callable=CookableIndex)
+    def test_ingredient_recipe_changes(self, index):
+        author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='author', last_name='author'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        flour, sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар')
+        )
+        row = IngredientRecipe.objects.create(
+            recipe=recipe, ingredient=flour, amount=100)
+        self.assertEqual(index.match([flour.pk]), [(recipe.pk, 1, 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=sugar, amount=50)
+        self.assertEqual(index.match([flour.pk]), [])
+        self.assertEqual(index.match([flour.pk], 1), [(recipe.pk, 1, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            row.delete()
+        self.assertEqual(index.match([sugar.pk]), [(recipe.pk, 1, 0)])
+
+    def test_expired_index_rebuilds_in_background(self):
+        index = CookableIndex(ttl=0)
+        index._swap(index._build([(1, 1)]))
+        loading = threading.Event()
+        release = threading.Event()
+
+        def load():
+            loading.set()
+            release.wait(5)
+            return index._build([(1, 2)])
+
+        with mock.patch.object(index, '_load', side_effect=load):
+            # Пока новый индекс строится, запросы читают прежний.
+            self.assertEqual(index.match([1]), [(1, 1, 0)])
+            rebuilding = index._rebuilding
+            self.assertTrue(loading.wait(5))
+            self.assertEqual(index.match([1]), [(1, 1, 0)])
+            with mock.patch.object(index, 'refresh_recipe') as refresh:
+                index.remove_recipe(1)
+                release.set()
+                rebuilding.join(5)
+        index.ttl = 60
+        self.assertEqual(index.match([1]), [(2, 1, 0)])
+        refresh.assert_called_once_with(1)
+
+
+class CounterTests(TestCase):
+    """
+    Счётчики favorites_count, recipes_count и followers_count: меняются
+    через F() в своих путях, не затираются обычным save() и
+    сверяются командой reconcile_counters.
+    """
+
+    def setUp(self):
+        self.author, self.reader = (
+            User.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name
+            )
+            for name in ('author', 'reader')
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def counters(self):
+        self.author.refresh_from_db()
+        self.recipe.refresh_from_db()
+        return (self.recipe.favorites_count, self.author.recipes_count,
+                self.author.followers_count)
+
+    def test_api_paths(self):
+        self.assertEqual(self.counters(), (0, 1, 0))
+        self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(self.counters(), (1, 1, 1))
+        self.client.delete(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.client.delete(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(self.counters(), (0, 1, 0))
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_save_keeps_counters(self):
+        # Устаревшие экземпляры, загруженные до изменения счётчиков.
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        Follow.objects.create(user=self.reader, following=self.author)
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Новое имя'
+        author.save()
+        self.assertEqual(self.counters(), (1, 1, 1))
+        self.assertEqual(self.recipe.name, 'Новое название')
+
+    def test_reconcile_counters(self):
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=7)
+        User.objects.filter(pk=self.author.pk).update(
+            recipes_count=0, followers_count=3)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', check=True, stdout=StringIO())
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 1, 0))
+        call_command('reconcile_counters', check=True, stdout=StringIO())
+
+
+class ImageVariantTests(TestCase):
+    """
+    Варианты картинки рецепта: уменьшенная копия, WebP и превью
+    строятся после коммита в пуле и заменяют прежние файлы.
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='author', last_name='author'
+        )
+
+    def image_file(self, size=(2000, 1000)):
+        content = BytesIO()
+        Image.new('RGB', size, 'orange').save(content, format='PNG')
+        return ContentFile(content.getvalue(), name='photo.png')
+
+    def create_recipe(self):
+        recipe = Recipe(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10
+        )
+        recipe.image.save('photo.png', self.image_file(), save=False)
+        recipe.save()
+        return recipe
+
+    @mock.patch('recipes.images.RECIPE_IMAGE_PLACEHOLDER', True)
+    def test_generate_variants(self):
+        recipe = self.create_recipe()
+        generate_variants(recipe.pk)
+        recipe.refresh_from_db()
+        with Image.open(recipe.thumbnail) as thumbnail:
+            self.assertEqual(thumbnail.format, 'JPEG')
+            self.assertEqual(thumbnail.size, (400, 200))
+        with Image.open(recipe.image_webp) as webp:
+            self.assertEqual(webp.format, 'WEBP')
+            self.assertEqual(webp.size, (1200, 600))
+        self.assertTrue(recipe.image_placeholder.startswith(
+            'data:image/webp;base64,'))
+
+    def test_stale_variants_are_deleted(self):
+        recipe = self.create_recipe()
+        generate_variants(recipe.pk)
+        recipe.refresh_from_db()
+        old = (recipe.thumbnail.name, recipe.image_webp.name)
+        generate_variants(recipe.pk)
+        recipe.refresh_from_db()
+        storage = recipe.image.storage
+        for name in old:
+            self.assertFalse(storage.exists(name))
+        self.assertTrue(storage.exists(recipe.thumbnail.name))
+        self.assertTrue(storage.exists(recipe.image_webp.name))
+
+    def test_upload_schedules_variants_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        image = base64.b64encode(self.image_file().read()).decode()
+        tag = Tag.objects.create(name='Тег', slug='tag', color='#FFFFFF')
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г')
+        with mock.patch('recipes.images.get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.post('/api/recipes/', {
+                    'name': 'Рецепт',
+                    'text': 'Описание',
+                    'cooking_time': 10,
+                    'tags': [tag.pk],
+                    'ingredients': [{'id': ingredient.pk, 'amount': 10}],
+                    'image': f'data:image/png;base64,{image}',
+                }, format='json')
+                get_executor().submit.assert_not_called()
+        self.assertEqual(response.status_code, 201, response.data)
+        get_executor().submit.assert_called_once_with(
+            run_task, response.data['id'])
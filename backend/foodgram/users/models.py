@@ -2,7 +2,27 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Поля counter_fields меняются только F()-выражениями в сигналах.
+    Обычный save() уже сохранённого объекта их не пишет, иначе
+    значение из памяти затрёт приращения, сделанные после загрузки.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            skipped = self.get_deferred_fields() | set(self.counter_fields)
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+                and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     username = models.CharField(
         max_length=150,
         verbose_name='Логин',
@@ -30,6 +50,17 @@ class User(AbstractUser):
         verbose_name='Пароль',
         help_text='Введите пароль'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков'
+    )
+    counter_fields = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 
@@ -47,7 +78,8 @@ class Follow(models.Model):
         User,
         related_name='follower',
         verbose_name='Подписчик',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
 
     following = models.ForeignKey(
@@ -55,7 +87,8 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Избранный автор',
         help_text='Выберите пользователя',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
 
     class Meta:
@@ -67,6 +100,13 @@ class Follow(models.Model):
                 name='unique_users'
             ),
         )
+        # Подписчики автора: рассылка ленты и followers_count.
+        indexes = (
+            models.Index(
+                fields=('following', 'user'),
+                name='follow_following_user_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.user} подписан на {self.following}'
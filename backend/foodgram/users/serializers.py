@@ -1,11 +1,14 @@
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
+from api.fields import ImageURLField
 from users.models import User, Follow
 from recipes.models import Recipe
 
 
 class RecipeInfoSerializer(serializers.ModelSerializer):
+    image = ImageURLField()
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
@@ -57,6 +60,8 @@ class UserSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context.get('request').user.is_authenticated:
             user = self.context.get('request').user
             return Follow.objects.filter(user=user, following=obj).exists()
@@ -64,7 +69,6 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class SubscribeResponseSerializer(serializers.ModelSerializer):
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
 
@@ -73,18 +77,20 @@ class SubscribeResponseSerializer(serializers.ModelSerializer):
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count')
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = obj.recipes.order_by('id')[:int(recipes_limit)]
+        if hasattr(obj, 'shown_recipes'):
+            recipes = obj.shown_recipes
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.query_params.get('recipes_limit')
+            recipes = obj.recipes.order_by('id')
+            if recipes_limit:
+                recipes = recipes[:int(recipes_limit)]
         return RecipeInfoSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context.get('request').user.is_authenticated:
             user = self.context.get('request').user
             return Follow.objects.filter(user=user, following=obj).exists()
@@ -0,0 +1,29 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.settings import FEED_FANOUT_MAX_FOLLOWERS
+from recipes.feed import schedule_backfill
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.following_id).update(
+            followers_count=F('followers_count') + 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    User.objects.filter(
+        pk=instance.following_id, followers_count__gt=0
+    ).update(followers_count=F('followers_count') - 1)
+    # Счётчик читается в той же транзакции после UPDATE, поэтому порог
+    # пересекает ровно одна отписка.
+    crossed = User.objects.filter(
+        pk=instance.following_id,
+        followers_count=FEED_FANOUT_MAX_FOLLOWERS
+    ).exists()
+    if crossed:
+        schedule_backfill(instance.following_id)
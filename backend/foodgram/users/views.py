@@ -1,3 +1,5 @@
+from django.db.models import (Exists, OuterRef, Prefetch,
+                              prefetch_related_objects)
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -7,6 +9,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from djoser.views import UserViewSet
 
 from users.models import User, Follow
+from recipes.models import Recipe
 from users.serializers import (FollowSerializer, UserSerializer,
                                SubscribeResponseSerializer)
 
@@ -17,6 +20,29 @@ class CustomUserViewSet(UserViewSet):
     pagination_class = PageNumberPagination
     permission_classes = (AllowAny,)
 
+    def get_subscriptions_queryset(self, user):
+        return User.objects.filter(following__user=user).annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(user=user, following=OuterRef('pk'))
+            )
+        )
+
+    def prefetch_shown_recipes(self, authors):
+        """
+        Подгружает рецепты авторов в shown_recipes одним запросом,
+        не больше recipes_limit на автора.
+        """
+        recipes = Recipe.objects.filter(author__in=authors)
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit:
+            recipes = recipes.first_per_author(int(recipes_limit))
+        prefetch_related_objects(authors, Prefetch(
+            'recipes',
+            queryset=recipes.order_by('id'),
+            to_attr='shown_recipes'
+        ))
+        return authors
+
     @action(
         methods=('POST', 'DELETE'),
         detail=True,
@@ -35,8 +61,10 @@ class CustomUserViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save(user=user)
+            following = self.get_subscriptions_queryset(user).get(
+                id=following.id)
             serializer = SubscribeResponseSerializer(
-                following,
+                self.prefetch_shown_recipes([following])[0],
                 context={'request': request}
             )
             return Response(
@@ -63,8 +91,10 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         """ Возвращает подписки текущего пользователя. """
         user = request.user
-        subscriptions = User.objects.filter(following__user=user)
-        subscriptions = self.paginate_queryset(subscriptions)
+        subscriptions = self.get_subscriptions_queryset(user)
+        subscriptions = self.prefetch_shown_recipes(
+            self.paginate_queryset(subscriptions)
+        )
         serializer = SubscribeResponseSerializer(
             subscriptions,
             many=True,